@@ -0,0 +1,125 @@
+import time
+
+from array import array
+
+#fixed size buffer of the latest samples of one numeric sensor
+class RingBuffer:
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._values = array('d', bytes(8 * capacity))
+        self._times = array('d', bytes(8 * capacity))
+        self._next = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, value: float, timestamp: float) -> None:
+        self._values[self._next] = value
+        self._times[self._next] = timestamp
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    #min, max, mean and last of the samples not older than since, None if there are none
+    def stats(self, since: float):
+        count = 0
+        total = 0.
+        low = high = last = None
+        for i in range(self._size):
+            pos = (self._next - self._size + i) % self.capacity
+            if self._times[pos] < since:
+                continue
+            value = self._values[pos]
+            if count == 0:
+                low = high = value
+            else:
+                low = min(low, value)
+                high = max(high, value)
+            total += value
+            last = value
+            count += 1
+
+        if count == 0:
+            return None
+        return {"min": low, "max": high, "mean": round(total / count, 3), "last": last}
+
+#time spent in each state of an enum or binary sensor
+class StateTimer:
+
+    def __init__(self) -> None:
+        self.state = None
+        self.since = None
+        self.totals = {}
+
+    def update(self, state: str, timestamp: float) -> None:
+        if self.state is not None:
+            self.totals[self.state] = self.totals.get(self.state, 0.) + timestamp - self.since
+        self.state = state
+        self.since = timestamp
+
+    #totals up to now, the running state continues in the next window
+    def collect(self, timestamp: float) -> dict:
+        self.update(self.state, timestamp)
+        totals = {state: round(seconds, 1) for state, seconds in self.totals.items()}
+        self.totals = {}
+        return totals
+
+#rolling windows of the sensors in keys ({key: "numeric" or "state"})
+#numeric sensors give min/max/mean/last, state sensors the seconds per state
+class Aggregator:
+
+    def __init__(self, window: float, keys: dict, intervals: dict) -> None:
+        self.window = window
+        self.keys = keys
+
+        self._buffers = {}
+        self._timers = {}
+        for key, kind in keys.items():
+            if kind == "numeric":
+                #room for every sample of one window
+                capacity = int(window / intervals.get(key, window)) + 2
+                self._buffers[key] = RingBuffer(capacity)
+            else:
+                self._timers[key] = StateTimer()
+
+        self._windowStart = time.time()
+
+    def add(self, stats: dict, timestamp: float) -> None:
+        for key, val in stats.items():
+            if val is None:
+                continue
+            buffer = self._buffers.get(key)
+            if buffer is not None:
+                if isinstance(val, float):
+                    buffer.append(val, timestamp)
+                continue
+            timer = self._timers.get(key)
+            if timer is not None and val != timer.state:
+                timer.update(val, timestamp)
+
+    def due(self, now: float = None) -> bool:
+        if now is None:
+            now = time.time()
+        return now >= self.deadline()
+
+    #end of the running window (seconds since the epoch)
+    def deadline(self) -> float:
+        return self._windowStart + self.window
+
+    #results of the finished window, starts the next one
+    def collect(self, now: float = None) -> dict:
+        if now is None:
+            now = time.time()
+
+        result = {}
+        for key, buffer in self._buffers.items():
+            stats = buffer.stats(self._windowStart)
+            if stats is not None:
+                result[key] = stats
+        for key, timer in self._timers.items():
+            if timer.state is not None:
+                result[key] = timer.collect(now)
+
+        self._windowStart = now
+        return result
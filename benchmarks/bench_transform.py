@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+#micro-benchmark of the value normalization: the former modifyStats() against the transform table
+#usage: python3 benchmarks/bench_transform.py [-n rounds]
+
+import re
+import sys
+import timeit
+import argparse
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from htheatpump.htparams import HtDataTypes, HtParams
+from value_transform import applyTransforms, buildTransforms
+
+#modifyStats() as it was before the transform table
+def legacyModifyStats(data: dict) -> dict:
+    norm_values = {}
+    for name, val in data.items():
+
+        #normalize key
+        new_key = re.sub(r'[^A-Za-z]', '', name).lower()
+
+
+        new_val = val
+
+        if new_key == "betriebsart":
+            match new_val:
+                case 0:
+                    new_val = "Aus"
+                case 1:
+                    new_val = "Auto"
+                case 2:
+                    new_val = "Kühlen"
+                case 3:
+                    new_val = "Sommer"
+                case 4:
+                    new_val = "Dauerbetrieb"
+                case 5:
+                    new_val = "Absenken"
+                case 6:
+                    new_val = "Urlaub"
+                case 7:
+                    new_val = "Party"
+                case _:
+                    new_val = None
+
+        #if it is boolean convert to string
+        if isinstance(new_val, bool):
+            if new_val:
+                new_val = "ON"
+            else:
+                new_val = "OFF"
+
+        #if it is a number and smaller then -50, then kill data
+        try:
+            new_val = float(new_val)
+            if new_val <= -50.:
+                new_val = None
+        except ValueError:
+            pass
+
+        norm_values[new_key] = new_val
+
+    return norm_values
+
+#one full query result with values in the middle of the parameter limits
+def sampleData() -> dict:
+    data = {}
+    for name, param in HtParams.items():
+        if param.data_type == HtDataTypes.BOOL:
+            data[name] = True
+        elif param.data_type == HtDataTypes.INT:
+            data[name] = (param.min_val + param.max_val) // 2
+        else:
+            data[name] = round((param.min_val + param.max_val) / 2, 1)
+    return data
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the former modifyStats() with the transform table")
+    parser.add_argument("-n", "--rounds", type=int, default=20000, help="normalizations per measurement (default: %(default)s)")
+    args = parser.parse_args()
+
+    data = sampleData()
+    transforms = buildTransforms()
+
+    setup = timeit.timeit(buildTransforms, number=100) / 100
+    legacy = min(timeit.repeat(lambda: legacyModifyStats(data), number=args.rounds, repeat=5)) / args.rounds
+    table = min(timeit.repeat(lambda: applyTransforms(transforms, data), number=args.rounds, repeat=5)) / args.rounds
+
+    print("parameters per cycle:   %d" % len(data))
+    print("legacy modifyStats:     %8.2f us/cycle" % (legacy * 1e6))
+    print("transform table:        %8.2f us/cycle" % (table * 1e6))
+    print("speedup:                %8.2fx" % (legacy / table))
+    print("table build (once):     %8.2f us" % (setup * 1e6))
+
+if __name__ == "__main__":
+   main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+
+#Heliotherm heat pump emulator on a pseudo terminal, speaks the protocol used by HtHeatpump
+#usage: python3 benchmarks/hp_emulator.py [--latency seconds] [--error_rate p] [--drop_rate p]
+#prints the device to pass to htmqtt.py with -d and serves until Ctrl-C
+
+import os
+import pty
+import sys
+import tty
+import math
+import time
+import random
+import select
+import argparse
+import threading
+
+from datetime import datetime, timedelta
+
+from htheatpump.htparams import HtDataTypes, HtParams
+from htheatpump.protocol import REQUEST_HEADER, calc_checksum
+
+RESPONSE_HEADER = b"\x02\xfd\xe0\xd0\x00\x00"
+#header of the answers with a fixed checksum of 0, which the real heat pump sends now and then
+RESPONSE_HEADER_NO_CHECKSUM = b"\x02\xfd\xe0\xd0\x04\x00"
+
+#HtHeatpump opens the port with XON/XOFF flow control, these bytes never arrive
+FLOW_CONTROL = (0x11, 0x13)
+
+#answers every request after latency (+- jitter) seconds plus the transfer time at baudrate
+#with probability errorRate a response gets a broken checksum, with dropRate it is not sent at all,
+#parameters in stuckParams never answer
+#counts requests and bytes on the link and groups requests into bursts (one poll cycle each)
+class HeatPumpEmulator:
+
+    def __init__(self, latency: float = 0.02, jitter: float = 0., errorRate: float = 0., dropRate: float = 0.,
+                 baudrate: int = 115200, serialNumber: int = 123456, version: tuple = ("3.0.20", 2321),
+                 faults: list = None, clockOffset: float = 0., burstGap: float = 0.5, stuckParams: tuple = (), seed: int = None) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.errorRate = errorRate
+        self.dropRate = dropRate
+        self.baudrate = baudrate
+        self.serialNumber = serialNumber
+        self.version = version
+        self.clockOffset = clockOffset
+        self.burstGap = burstGap
+        self.stuckParams = set(stuckParams)
+
+        #fault list entries as (error code, datetime, message)
+        self.faults = list(faults) if faults is not None else []
+
+        self.requests = 0
+        self.paramReads = 0
+        self.errors = 0
+        self.drops = 0
+        self.bytesIn = 0
+        self.bytesOut = 0
+        self.bursts = []
+
+        self._random = random.Random(seed)
+        self._start = time.time()
+        self._lastRequest = 0.
+        self._master = None
+        self._slave = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+        self._paramsByCmd = {param.cmd(): (name, param) for name, param in HtParams.items()}
+        self._paramsByNumber = {param.dp_number: (name, param) for name, param in HtParams.items() if param.dp_type == "MP"}
+
+    @property
+    def device(self) -> str:
+        return os.ttyname(self._slave)
+
+    def start(self) -> None:
+        self._master, self._slave = pty.openpty()
+        #no echo and no line ending translation on the device side
+        tty.setraw(self._slave)
+        self._thread = threading.Thread(target=self._run, name="hp-emulator", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+    def resetCounters(self) -> None:
+        with self._lock:
+            self.requests = 0
+            self.paramReads = 0
+            self.errors = 0
+            self.drops = 0
+            self.bytesIn = 0
+            self.bytesOut = 0
+            self.bursts = []
+
+    #current value of a parameter, slowly changing so change based publishing has something to do
+    def value(self, name: str, param, now: float = None):
+        if now is None:
+            now = time.time()
+        elapsed = now - self._start
+        number = param.dp_number
+
+        if param.data_type == HtDataTypes.BOOL:
+            return int(now / (60 + number * 7)) % 2 == 1
+
+        low, high = param.min_val, param.max_val
+        if param.data_type == HtDataTypes.FLOAT:
+            middle = (low + high) / 2.
+            amplitude = (high - low) / 4.
+            return round(middle + amplitude * math.sin(now / (300. + number * 13) + number), 1)
+
+        #counters run up, everything else cycles slowly through its range
+        if name.startswith("BSZ"):
+            return min(low + number + int(elapsed / 60), high)
+        return low + (int(now / 600) + number) % (high - low + 1)
+
+    def _run(self) -> None:
+        buffer = b""
+        while not self._stop.is_set():
+            ready, _, _ = select.select([self._master], [], [], 0.2)
+            if not ready:
+                continue
+            try:
+                buffer += os.read(self._master, 4096)
+            except OSError:
+                time.sleep(0.05)
+                continue
+
+            while True:
+                start = buffer.find(REQUEST_HEADER)
+                if start < 0:
+                    buffer = buffer[-len(REQUEST_HEADER):]
+                    break
+                buffer = buffer[start:]
+                if len(buffer) < len(REQUEST_HEADER) + 1:
+                    break
+                length = buffer[len(REQUEST_HEADER)]
+                end = len(REQUEST_HEADER) + 1 + length + 1
+                if len(buffer) < end:
+                    break
+                frame, buffer = buffer[:end], buffer[end:]
+                self._handle(frame)
+
+    def _handle(self, frame: bytes) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self.requests += 1
+            self.bytesIn += len(frame)
+            if not self.bursts or now - self._lastRequest > self.burstGap:
+                self.bursts.append([now, now, 0, 0])
+            self._lastRequest = now
+            burst = self.bursts[-1]
+            burst[2] += 1
+
+        if calc_checksum(frame[:-1]) != frame[-1]:
+            return
+        command = frame[len(REQUEST_HEADER) + 1:-1].decode("ascii").strip("~;")
+
+        responses = self._respond(command)
+        if responses and responses[0].startswith(("MP,", "SP,", "MA,")) and not command.startswith("SP,NR=9"):
+            with self._lock:
+                self.paramReads += len(responses)
+                burst[3] += len(responses)
+
+        delay = self.latency
+        if self.jitter:
+            delay += self._random.uniform(-self.jitter, self.jitter)
+
+        data = b""
+        for response in responses:
+            payload = ("~" + response + ";\r\n").encode("ascii")
+            message = RESPONSE_HEADER + bytes([len(payload)]) + payload
+            checksum = calc_checksum(message)
+            if len(payload) in FLOW_CONTROL:
+                #a length of 0 makes the reader look for the trailing \r\n instead
+                message = RESPONSE_HEADER_NO_CHECKSUM + b"\x00" + payload
+                checksum = 0
+            elif checksum in FLOW_CONTROL:
+                message = RESPONSE_HEADER_NO_CHECKSUM + message[len(RESPONSE_HEADER):]
+                checksum = 0
+            if self.errorRate and self._random.random() < self.errorRate:
+                checksum ^= 0xff
+                self.errors += 1
+            data += message + bytes([checksum])
+
+        if not responses or (self.dropRate and self._random.random() < self.dropRate):
+            self.drops += 1
+            return
+
+        if self.baudrate:
+            delay += len(data) * 10. / self.baudrate
+        if delay > 0:
+            time.sleep(delay)
+
+        os.write(self._master, data)
+        with self._lock:
+            self.bytesOut += len(data)
+            burst[1] = time.monotonic()
+
+    def _respond(self, command: str) -> list:
+        if command in ("LIN", "LOUT"):
+            return ["OK"]
+        if command == "RID":
+            return ["RID,%d" % self.serialNumber]
+        if command == "SP,NR=9":
+            return ["SP,NR=9,ID=9,NAME=%s,LEN=1,TP=0,BI=0,VAL=%d,MAX=%d,MIN=%d" % (self.version[0], self.version[1], self.version[1], self.version[1])]
+        if command.startswith("CLK"):
+            if command.startswith("CLK,"):
+                #the host sets the time, the clock runs without drift from now on
+                self.clockOffset = 0.
+            return [self._clock()]
+        if command == "ALS":
+            return ["SUM=%d" % len(self.faults)]
+        if command.startswith("AR,"):
+            return [self._fault(int(idx)) for idx in command.split(",")[1:]]
+        if command.startswith("MR,"):
+            now = time.time()
+            responses = []
+            for number in command.split(",")[1:]:
+                name, param = self._paramsByNumber[int(number)]
+                if name in self.stuckParams:
+                    continue
+                response = "MA,%d,%s,17" % (param.dp_number, param.to_str(self.value(name, param, now)))
+                if len(response) + 4 in FLOW_CONTROL:
+                    #the meaning of the last field is unknown, a shorter one keeps the length byte clear of XON/XOFF
+                    response = response[:-3] + ",7"
+                responses.append(response)
+            return responses
+
+        entry = self._paramsByCmd.get(command)
+        if entry is not None:
+            name, param = entry
+            if name in self.stuckParams:
+                return []
+            return ["%s,ID=%d,NAME=%s,LEN=1,TP=0,BI=0,VAL=%s,MAX=%s,MIN=%s" % (
+                command, param.dp_number, name, param.to_str(self.value(name, param)), param.to_str(param.max_val), param.to_str(param.min_val))]
+
+        return ["ERR,INVALID CMD"]
+
+    def _clock(self) -> str:
+        now = datetime.now() + timedelta(seconds=self.clockOffset)
+        return "CLK,DA=%s,TI=%s,WD=%d" % (now.strftime("%d.%m.%y"), now.strftime("%H:%M:%S"), now.isoweekday())
+
+    def _fault(self, idx: int) -> str:
+        if idx >= len(self.faults):
+            return "ERR,INVALID IDX"
+        error, dt, message = self.faults[idx]
+        return "AA,%d,%d,%s,%s" % (idx, error, dt.strftime("%d.%m.%y-%H:%M:%S"), message)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Heliotherm heat pump emulator on a pseudo terminal")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per request (default: %(default)s)")
+    parser.add_argument("--jitter", type=float, default=0., help="random +- seconds on top of the latency (default: %(default)s)")
+    parser.add_argument("--error_rate", type=float, default=0., help="share of responses with a broken checksum (default: %(default)s)")
+    parser.add_argument("--drop_rate", type=float, default=0., help="share of requests without response (default: %(default)s)")
+    parser.add_argument("--baudrate", type=int, default=115200, help="simulated link speed, 0 for none (default: %(default)s)")
+    parser.add_argument("--clock_offset", type=float, default=0., help="seconds the clock of the heat pump is off (default: %(default)s)")
+    args = parser.parse_args()
+
+    emulator = HeatPumpEmulator(args.latency, args.jitter, args.error_rate, args.drop_rate, args.baudrate, clockOffset=args.clock_offset)
+    emulator.start()
+    print(emulator.device, flush=True)
+    try:
+        while True:
+            time.sleep(60)
+            print("%d requests, %d bytes in, %d bytes out, %d errors, %d drops" % (emulator.requests, emulator.bytesIn, emulator.bytesOut, emulator.errors, emulator.drops), flush=True)
+    except KeyboardInterrupt:
+        pass
+    emulator.stop()
+
+if __name__ == "__main__":
+    sys.exit(main())
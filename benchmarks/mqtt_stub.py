@@ -0,0 +1,171 @@
+import time
+import asyncio
+import threading
+
+#minimal in-process MQTT 3.1.1 broker for offline tests and benchmarks
+#supports CONNECT, PUBLISH (qos 0/1, retain), SUBSCRIBE with wildcards, PING and DISCONNECT
+#and counts the bytes and messages it sees, messages are kept as (monotonic time, topic, payload, retain)
+class MqttBrokerStub:
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.host = host
+        self.port = port
+        self.retained = {}
+        self.messages = []
+        self.bytesIn = 0
+        self.bytesOut = 0
+        self.connects = 0
+        self.recordMessages = True
+        self.refuseConnections = False
+
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._clients = set()
+        self._subscriptions = {}
+        self._started = threading.Event()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="mqtt-stub", daemon=True)
+        self._thread.start()
+        self._started.wait()
+
+    def stop(self) -> None:
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    #drop every client connection, e.g. to simulate a broker outage
+    def dropClients(self) -> None:
+        def close():
+            for writer in list(self._clients):
+                writer.transport.abort()
+        self._loop.call_soon_threadsafe(close)
+
+    def resetCounters(self) -> None:
+        self.messages = []
+        self.bytesIn = 0
+        self.bytesOut = 0
+
+    def _run(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._started.set()
+        self._loop.run_forever()
+        self._server.close()
+        self._loop.close()
+
+    async def _readPacket(self, reader):
+        header = await reader.readexactly(1)
+        length = 0
+        multiplier = 1
+        size = 1
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            size += 1
+            length += (byte & 0x7f) * multiplier
+            multiplier *= 128
+            if not byte & 0x80:
+                break
+        body = await reader.readexactly(length) if length else b""
+        self.bytesIn += size + length
+        return header[0], body
+
+    def _send(self, writer, packetType: int, body: bytes) -> None:
+        length = len(body)
+        encoded = bytearray()
+        while True:
+            byte = length % 128
+            length //= 128
+            if length:
+                byte |= 0x80
+            encoded.append(byte)
+            if not length:
+                break
+        packet = bytes([packetType]) + bytes(encoded) + body
+        self.bytesOut += len(packet)
+        writer.write(packet)
+
+    def _forward(self, topic: str, payload: bytes, retain: bool = False) -> None:
+        data = len(topic).to_bytes(2, "big") + topic.encode() + payload
+        for writer, filters in self._subscriptions.items():
+            if any(topicMatches(topicFilter, topic) for topicFilter in filters):
+                self._send(writer, 0x30 | (0x01 if retain else 0), data)
+
+    async def _handle(self, reader, writer) -> None:
+        if self.refuseConnections:
+            writer.transport.abort()
+            return
+        self._clients.add(writer)
+        try:
+            while True:
+                header, body = await self._readPacket(reader)
+                packetType = header >> 4
+
+                if packetType == 1:
+                    self.connects += 1
+                    self._send(writer, 0x20, b"\x00\x00")
+
+                elif packetType == 3:
+                    qos = (header >> 1) & 0x03
+                    retain = bool(header & 0x01)
+                    topicLength = int.from_bytes(body[:2], "big")
+                    topic = body[2:2 + topicLength].decode()
+                    pos = 2 + topicLength
+                    if qos > 0:
+                        packetId = body[pos:pos + 2]
+                        pos += 2
+                        self._send(writer, 0x40, packetId)
+                    payload = body[pos:]
+
+                    if self.recordMessages:
+                        self.messages.append((time.monotonic(), topic, payload, retain))
+                    if retain:
+                        if payload:
+                            self.retained[topic] = payload
+                        else:
+                            self.retained.pop(topic, None)
+                    self._forward(topic, payload)
+
+                elif packetType == 8:
+                    packetId = body[:2]
+                    pos = 2
+                    granted = bytearray()
+                    filters = self._subscriptions.setdefault(writer, [])
+                    while pos < len(body):
+                        filterLength = int.from_bytes(body[pos:pos + 2], "big")
+                        topicFilter = body[pos + 2:pos + 2 + filterLength].decode()
+                        pos += 2 + filterLength + 1
+                        filters.append(topicFilter)
+                        granted.append(0)
+                    self._send(writer, 0x90, packetId + bytes(granted))
+                    for topic, payload in list(self.retained.items()):
+                        if any(topicMatches(topicFilter, topic) for topicFilter in filters):
+                            data = len(topic).to_bytes(2, "big") + topic.encode() + payload
+                            self._send(writer, 0x31, data)
+
+                elif packetType == 12:
+                    self._send(writer, 0xd0, b"")
+
+                elif packetType == 14:
+                    break
+
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._clients.discard(writer)
+            self._subscriptions.pop(writer, None)
+            writer.close()
+
+def topicMatches(topicFilter: str, topic: str) -> bool:
+    filterParts = topicFilter.split("/")
+    topicParts = topic.split("/")
+    for i, part in enumerate(filterParts):
+        if part == "#":
+            return True
+        if i >= len(topicParts) or (part != "+" and part != topicParts[i]):
+            return False
+    return len(filterParts) == len(topicParts)
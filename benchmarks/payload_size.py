@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+#size and encoding time of the values payload per payload format, for a full snapshot of emulated values
+#usage: python3 benchmarks/payload_size.py [-n cycles]
+
+import sys
+import time
+import argparse
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from htheatpump.htparams import HtParams
+from hp_emulator import HeatPumpEmulator
+from payload_codec import PAYLOAD_FORMATS, PayloadEncoder
+from value_transform import applyTransforms, buildTransforms
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="size and encoding time of the values payload per format")
+    parser.add_argument("-n", "--cycles", type=int, default=1000, help="encoded snapshots per format (default: %(default)s)")
+    args = parser.parse_args()
+
+    #the same values htmqtt.py would publish for the emulated heat pump, one snapshot per minute
+    emulator = HeatPumpEmulator()
+    transforms = buildTransforms()
+    start = time.time()
+    snapshots = []
+    for i in range(args.cycles):
+        now = start + i * 60.
+        snapshots.append(applyTransforms(transforms, {name: emulator.value(name, param, now) for name, param in HtParams.items()}))
+
+    rows = [("format", "bytes/cycle", "vs json", "us/cycle")]
+    baseline = None
+    for payloadFormat in PAYLOAD_FORMATS:
+        encoder = PayloadEncoder(payloadFormat)
+        total = 0
+        began = time.perf_counter()
+        for stats in snapshots:
+            payload = encoder.encode(stats)
+            total += len(payload.encode("utf-8") if isinstance(payload, str) else payload)
+        elapsed = time.perf_counter() - began
+
+        size = total / len(snapshots)
+        if baseline is None:
+            baseline = size
+        rows.append((payloadFormat, "%.1f" % size, "%.0f%%" % (size * 100. / baseline), "%.1f" % (elapsed * 1e6 / len(snapshots))))
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    for row in rows:
+        print("  ".join(cell.rjust(width) if i else cell.ljust(width) for i, (cell, width) in enumerate(zip(row, widths))))
+
+    missing = [name for name in ("cbor", "msgpack") if name not in PAYLOAD_FORMATS]
+    if missing:
+        print("not installed: %s" % ", ".join(missing))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+
+#scenario benchmark and soak test of htmqtt.py against the heat pump emulator and the broker stub, fully offline
+#usage: python3 benchmarks/soak.py [-d seconds] [-s scenario ...] [-c poll_config] [-j result.json]
+#a soak test is the same run with a long duration, e.g. -d 14400 -s bulk-changes
+#htmqtt.py runs as a child process and writes its usual htmqtt.log
+
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import tempfile
+import importlib.util
+import subprocess
+
+from pathlib import Path
+from statistics import mean, median
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from hp_emulator import HeatPumpEmulator
+from mqtt_stub import MqttBrokerStub
+
+HTMQTT = str(Path(__file__).resolve().parent.parent / "htmqtt.py")
+TOPIC = "bench"
+
+#htmqtt.py arguments, emulator settings, broker outages (every, length in seconds) and optional packages per scenario
+SCENARIOS = {
+    "single":            {"args": []},
+    "bulk":              {"args": ["-f"]},
+    "changes":           {"args": ["-m", "changes"]},
+    "bulk-changes":      {"args": ["-f", "-m", "changes"]},
+    "bulk-changes-qos1": {"args": ["-f", "-m", "changes", "-q", "1"]},
+    "bulk-compact":      {"args": ["-f", "--payload_format", "compact"]},
+    "bulk-cbor":         {"args": ["-f", "--payload_format", "cbor"], "requires": "cbor2"},
+    "bulk-msgpack":      {"args": ["-f", "--payload_format", "msgpack"], "requires": "msgpack"},
+    "aggregate-only":    {"args": ["-f", "-w", "60", "--aggregate_only"]},
+    "no-keepalive":      {"args": ["-f", "-a", "0"]},
+    "flaky-serial":      {"args": ["-f"], "emulator": {"errorRate": 0.01, "dropRate": 0.001}},
+    "stuck-param":       {"args": ["-f"], "emulator": {"stuckParams": ("Temp. Sauggas", "HKR Soll_Raum")}},
+    "broker-outage":     {"args": ["-f", "-o"], "outage": (120, 30)},
+}
+
+#user and system cpu seconds of a running process, None where /proc is not available
+def cpuTime(pid: int):
+    try:
+        with open("/proc/%d/stat" % pid) as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+#resident memory in MB of a running process, None where /proc is not available
+def rss(pid: int):
+    try:
+        with open("/proc/%d/status" % pid) as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.
+    except (OSError, ValueError):
+        pass
+    return None
+
+def percentile(values: list, share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * share), len(ordered) - 1)]
+
+#time from the first serial request of a cycle to the last value message of that cycle at the broker
+def cycleLatencies(bursts: list, messages: list) -> list:
+    cycles = [burst for burst in bursts if burst[3] > 0]
+    valueTimes = [timestamp for timestamp, topic, payload, retain in messages if topic.startswith(TOPIC + "/values")]
+
+    latencies = []
+    pos = 0
+    for i, burst in enumerate(cycles):
+        end = cycles[i + 1][0] if i + 1 < len(cycles) else float("inf")
+        last = None
+        while pos < len(valueTimes) and valueTimes[pos] < end:
+            if valueTimes[pos] >= burst[0]:
+                last = valueTimes[pos]
+            pos += 1
+        if last is not None:
+            latencies.append(last - burst[0])
+    return latencies
+
+def runScenario(name: str, spec: dict, duration: float, warmup: float, sampleInterval: float, latency: float, pollConfig: str, workDir: str) -> dict:
+    emulator = HeatPumpEmulator(latency=latency, seed=1, **spec.get("emulator", {}))
+    broker = MqttBrokerStub()
+    emulator.start()
+    broker.start()
+
+    stateDir = tempfile.mkdtemp(prefix=name + "-", dir=workDir)
+    cmd = [sys.executable, HTMQTT, "-d", emulator.device, "-t", TOPIC, "-x", "127.0.0.1", "-p", str(broker.port), "-s", stateDir, "-l", "warning"]
+    if pollConfig:
+        cmd += ["-c", pollConfig]
+    cmd += spec["args"]
+
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+    started = time.monotonic()
+
+    #discovery and login are not part of a cycle
+    time.sleep(warmup)
+    emulator.resetCounters()
+    broker.resetCounters()
+    cpuStart = cpuTime(proc.pid)
+    measureStart = time.monotonic()
+
+    memory = []
+    outage = spec.get("outage")
+    nextOutage = measureStart + outage[0] if outage else None
+    while time.monotonic() - measureStart < duration and proc.poll() is None:
+        time.sleep(min(sampleInterval, max(duration - (time.monotonic() - measureStart), 0.)))
+        value = rss(proc.pid)
+        if value is not None:
+            memory.append(value)
+
+        if nextOutage is not None and time.monotonic() >= nextOutage:
+            broker.refuseConnections = True
+            broker.dropClients()
+            time.sleep(outage[1])
+            broker.refuseConnections = False
+            nextOutage = time.monotonic() + outage[0]
+
+    cpuEnd = cpuTime(proc.pid)
+    elapsed = time.monotonic() - measureStart
+    crashed = proc.poll() is not None
+
+    proc.send_signal(signal.SIGTERM)
+    try:
+        proc.wait(30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+    broker.stop()
+    emulator.stop()
+
+    cycles = sum(1 for burst in emulator.bursts if burst[3] > 0)
+    latencies = cycleLatencies(emulator.bursts, broker.messages)
+    perCycle = lambda value: round(value / cycles, 1) if cycles else None
+
+    result = {
+        "scenario": name,
+        "args": " ".join(spec["args"]),
+        "seconds": round(elapsed, 1),
+        "crashed": crashed,
+        "cycles": cycles,
+        "params_per_cycle": perCycle(emulator.paramReads),
+        "latency_mean_ms": round(mean(latencies) * 1000., 1) if latencies else None,
+        "latency_p50_ms": round(median(latencies) * 1000., 1) if latencies else None,
+        "latency_p95_ms": round(percentile(latencies, 0.95) * 1000., 1) if latencies else None,
+        "latency_max_ms": round(max(latencies) * 1000., 1) if latencies else None,
+        "serial_requests_per_cycle": perCycle(emulator.requests),
+        "serial_bytes_per_cycle": perCycle(emulator.bytesIn + emulator.bytesOut),
+        "serial_errors": emulator.errors + emulator.drops,
+        "mqtt_messages_per_cycle": perCycle(len(broker.messages)),
+        "mqtt_bytes_per_cycle": perCycle(broker.bytesIn),
+        "mqtt_buffered": sum(1 for message in broker.messages if message[1].endswith("/buffered")),
+        "cpu_ms_per_cycle": round((cpuEnd - cpuStart) * 1000. / cycles, 2) if cycles and cpuStart is not None and cpuEnd is not None else None,
+        "rss_start_mb": round(memory[0], 1) if memory else None,
+        "rss_end_mb": round(memory[-1], 1) if memory else None,
+        "rss_max_mb": round(max(memory), 1) if memory else None,
+        "runtime_seconds": round(time.monotonic() - started, 1),
+    }
+    return result
+
+def printTable(results: list) -> None:
+    columns = [
+        ("scenario", "scenario"), ("cycles", "cycles"), ("latency_p50_ms", "p50 ms"), ("latency_p95_ms", "p95 ms"),
+        ("serial_bytes_per_cycle", "serial B/cyc"), ("mqtt_messages_per_cycle", "msgs/cyc"), ("mqtt_bytes_per_cycle", "mqtt B/cyc"),
+        ("cpu_ms_per_cycle", "cpu ms/cyc"), ("rss_start_mb", "rss start"), ("rss_end_mb", "rss end"), ("rss_max_mb", "rss max"),
+    ]
+    rows = [[label for key, label in columns]]
+    for result in results:
+        rows.append(["-" if result[key] is None else str(result[key]) for key, label in columns])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    for row in rows:
+        print("  ".join(cell.rjust(width) if i else cell.ljust(width) for i, (cell, width) in enumerate(zip(row, widths))))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="benchmark and soak test of htmqtt.py against an emulated heat pump and broker")
+    parser.add_argument("-d", "--duration", type=float, default=120, help="measured seconds per scenario (default: %(default)s)")
+    parser.add_argument("-w", "--warmup", type=float, default=10, help="seconds before measuring, covers login and discovery (default: %(default)s)")
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS), help="scenario to run, repeat for several (default: all)")
+    parser.add_argument("-c", "--poll_config", type=str, help="poll config passed to htmqtt.py, e.g. to shorten the intervals")
+    parser.add_argument("-l", "--latency", type=float, default=0.02, help="emulated seconds per serial request (default: %(default)s)")
+    parser.add_argument("-m", "--memory_interval", type=float, default=10, help="seconds between memory samples (default: %(default)s)")
+    parser.add_argument("-j", "--json", type=str, help="write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="htmqtt-bench-") as workDir:
+        for name in args.scenario or SCENARIOS:
+            requires = SCENARIOS[name].get("requires")
+            if requires is not None and importlib.util.find_spec(requires) is None:
+                print("skipping %s, %s is not installed" % (name, requires), file=sys.stderr, flush=True)
+                continue
+            print("running %s for %.0f seconds ..." % (name, args.duration), file=sys.stderr, flush=True)
+            results.append(runScenario(name, SCENARIOS[name], args.duration, args.warmup, args.memory_interval, args.latency, args.poll_config, workDir))
+
+    printTable(results)
+    for result in results:
+        if result["crashed"]:
+            print("%s: htmqtt.py exited during the run" % result["scenario"])
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    sys.exit(main())
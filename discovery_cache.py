@@ -0,0 +1,35 @@
+import hashlib
+
+from pathlib import Path
+from state_file import JsonStateFile
+
+#collects the messages sensor.publish() would send, so they can be hashed before publishing
+class MessageRecorder:
+
+    def __init__(self) -> None:
+        self.messages = []
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.messages.append((topic, payload, qos, retain))
+
+def hashMessages(messages: list) -> str:
+    digest = hashlib.sha256()
+    for topic, payload, qos, retain in messages:
+        digest.update(repr((topic, payload, qos, retain)).encode("utf-8"))
+    return digest.hexdigest()
+
+#hash of the discovery messages last published per node, kept in a JSON file
+class DiscoveryCache:
+
+    def __init__(self, path: Path) -> None:
+        self._file = JsonStateFile(path, "discovery cache")
+        self._hashes = self._file.load()
+
+    def published(self, nodeId: str, digest: str) -> bool:
+        return self._hashes.get(nodeId) == digest
+
+    def store(self, nodeId: str, digest: str) -> None:
+        if self._hashes.get(nodeId) == digest:
+            return
+        self._hashes[nodeId] = digest
+        self._file.save(self._hashes)
@@ -0,0 +1,81 @@
+import logging
+
+from datetime import datetime
+from pathlib import Path
+from htheatpump.htheatpump import HtHeatpump
+from state_file import JsonStateFile
+
+#entry of the fault list as published: index, error code, local time in ISO format and message
+def faultEntry(entry: dict) -> dict:
+    return {
+        "index": entry["index"],
+        "error": entry["error"],
+        "datetime": entry["datetime"].astimezone().isoformat(),
+        "message": entry["message"],
+    }
+
+#entries read per AR frame while searching the list backwards for the newest known entry
+FAULT_CHUNK = 10
+
+#the same fault, the index of an entry moves when the heat pump rotates its list
+def sameFault(a: dict, b: dict) -> bool:
+    return a["error"] == b["error"] and a["datetime"] == b["datetime"] and a["message"] == b["message"]
+
+#incremental sync of the fault list, the size of the list and its newest entry per node are kept in a JSON file
+#a check costs one ALS frame and one AR frame for the newest known entry and the new ones behind it;
+#a full list rotates without growing, then the newest known entry is searched backwards from the end
+#in FAULT_CHUNK entries per frame, only if it is gone (list cleared or rewritten) the whole list is read
+#and every entry newer than the known one is new
+#the first sync of a node only takes the newest entry, the history isn't reported as new faults
+class FaultListSync:
+
+    def __init__(self, path: Path) -> None:
+        self._file = JsonStateFile(path, "fault list state")
+        self._states = self._file.load()
+
+    def lastFault(self, nodeId: str):
+        return self._states.get(nodeId, {}).get("last")
+
+    #(new entries oldest first, state to store() once they are published), runs on the heat pump session
+    def read(self, hp: HtHeatpump, nodeId: str) -> tuple:
+        state = self._states.get(nodeId)
+        size = hp.get_fault_list_size()
+
+        if state is None:
+            last = faultEntry(hp.get_fault_list(size - 1)[0]) if size > 0 else None
+            return [], {"size": size, "last": last}
+
+        known, last = state["size"], state["last"]
+        if size == 0:
+            return [], {"size": 0, "last": None}
+
+        if last is None and 0 <= known < size:
+            entries = [faultEntry(entry) for entry in hp.get_fault_list(*range(known, size))]
+            return entries, {"size": size, "last": entries[-1]}
+
+        #the newest known entry is expected at known - 1, the first frame reads it and everything behind it
+        entries = []
+        high = size
+        low = known - 1 if last is not None and 0 < known <= size else max(0, size - FAULT_CHUNK)
+        while True:
+            entries = [faultEntry(entry) for entry in hp.get_fault_list(*range(low, high))] + entries
+            if last is not None:
+                for i in range(high - low - 1, -1, -1):
+                    if sameFault(entries[i], last):
+                        return entries[i + 1:], {"size": size, "last": entries[-1]}
+            if low == 0:
+                break
+            high, low = low, max(0, low - FAULT_CHUNK)
+
+        logging.info("newest known fault of %s is gone, the list was rewritten", nodeId)
+        newest = entries[-1]
+        if last is not None:
+            since = datetime.fromisoformat(last["datetime"])
+            entries = [entry for entry in entries if datetime.fromisoformat(entry["datetime"]) > since]
+        return entries, {"size": size, "last": newest}
+
+    def store(self, nodeId: str, state: dict) -> None:
+        if self._states.get(nodeId) == state:
+            return
+        self._states[nodeId] = state
+        self._file.save(self._states)
@@ -1,17 +1,207 @@
-from typing import Type
+import re
+
+from typing import Type, NamedTuple
 from mqtt_homeassistant_utils import HAAvailability, HADevice, HASensor, HABinarySensor, HASensorEnergy, HASensorBattery, HASensorTemperature, HADeviceClassSensor, HADeviceClassBinarySensor
 
-def createSensors(nodeId: str, hadevice: HADevice, qos: int):
+#default polling intervals in seconds per group, can be overridden in the poll config file
+#the defaults stay below the serial load of reading everything once a minute (61 reads per minute):
+#5 fast parameters every 15 seconds, the rest of the live values every minute, about 48 reads per minute
+POLL_GROUPS = {
+    "fast": 15,
+    "normal": 60,
+    "setpoint": 600,
+    "counter": 3600,
+}
+
+#group for heat pump parameters without a sensor definition
+POLL_GROUP_DEFAULT = "normal"
+
+#minimal change of a value before it is published again in change-only mode,
+#by device class, all other sensors publish any change
+DEADBANDS = {
+    HADeviceClassSensor.TEMPERATURE: 0.2,
+    HADeviceClassSensor.PRESSURE: 0.1,
+}
+
+#operating modes of the heat pump
+BETRIEBSART = {
+    0: "Aus",
+    1: "Auto",
+    2: "Kühlen",
+    3: "Sommer",
+    4: "Dauerbetrieb",
+    5: "Absenken",
+    6: "Urlaub",
+    7: "Party",
+}
+
+#poll groups whose sensors get windowed min/max/mean or time-in-state entities
+AGGREGATE_GROUPS = ("fast", "normal")
+
+#counters only grow, the upper limit of the parameter definition would cut them off some day
+COUNTER_LIMITS = (0, None)
+
+#a disconnected temperature sensor reads -50 °C or below, everything above is a real reading
+TEMPERATURE_LIMITS = (-49.9, None)
+
+#diagnostic entities on <nodeId>/diagnostics: name, key in the payload, sensor options
+DIAGNOSTICS = [
+    ("Login time", "login_time", dict(device_class=HADeviceClassSensor.DURATION, unit_of_measurement="s", icon="mdi:login")),
+    ("Query time", "query_time", dict(device_class=HADeviceClassSensor.DURATION, unit_of_measurement="s", icon="mdi:timer-outline")),
+    ("Transform time", "transform_time", dict(device_class=HADeviceClassSensor.DURATION, unit_of_measurement="ms", icon="mdi:timer-outline")),
+    ("Publish time", "publish_time", dict(device_class=HADeviceClassSensor.DURATION, unit_of_measurement="ms", icon="mdi:timer-outline")),
+    ("Slowest parameter", "slowest_param", dict(icon="mdi:snail")),
+    ("Slowest parameter time", "slowest_param_time", dict(device_class=HADeviceClassSensor.DURATION, unit_of_measurement="s", icon="mdi:snail")),
+    ("Read failures", "read_failures", dict(state_class="total_increasing", icon="mdi:alert-circle-outline")),
+    ("Quarantined parameters", "quarantined_params", dict(state_class="measurement", icon="mdi:cancel")),
+    ("Read retries", "read_retries", dict(state_class="total_increasing", icon="mdi:refresh")),
+    ("MQTT reconnects", "mqtt_reconnects", dict(state_class="total_increasing", icon="mdi:lan-disconnect")),
+    ("Clock corrections", "clock_corrections", dict(state_class="total_increasing", icon="mdi:clock-edit-outline")),
+    ("Clock drift", "clock_drift", dict(device_class=HADeviceClassSensor.DURATION, unit_of_measurement="s", icon="mdi:clock-alert-outline")),
+]
+
+#limits: plausible range (min, max) of the readings, None for an open end, values outside are published as None
+#without limits every reading is published, the limits of HtParams are setting ranges, not sensor ranges
+class SensorDef(NamedTuple):
+    classType: Type
+    name: str
+    pollGroup: str
+    options: dict
+    deadband: float = None
+    enumMap: dict = None
+    limits: tuple = None
+
+SENSORS = [
+    SensorDef(HASensor, "Betriebsart", "setpoint", dict(device_class=HADeviceClassSensor.ENUM, icon="mdi:knob"), enumMap=BETRIEBSART),
+    SensorDef(HASensor, "BSZ EQ Betriebsstunden", "counter", dict(device_class=HADeviceClassSensor.DURATION, unit_of_measurement="h", icon="mdi:wrench-clock", suggested_display_precision=0), limits=COUNTER_LIMITS),
+    SensorDef(HASensor, "BSZ EQ Schaltungen", "counter", dict(icon="mdi:counter", suggested_display_precision=0), limits=COUNTER_LIMITS),
+    SensorDef(HASensor, "BSZ HKP Betriebsstunden", "counter", dict(device_class=HADeviceClassSensor.DURATION, unit_of_measurement="h", icon="mdi:wrench-clock", suggested_display_precision=0), limits=COUNTER_LIMITS),
+    SensorDef(HASensor, "BSZ HKP Schaltung", "counter", dict(icon="mdi:counter", suggested_display_precision=0), limits=COUNTER_LIMITS),
+    SensorDef(HASensor, "BSZ Verdichter akt. Laufzeit", "normal", dict(device_class=HADeviceClassSensor.DURATION, unit_of_measurement="s", icon="mdi:wrench-clock", suggested_display_precision=0), limits=COUNTER_LIMITS),
+    SensorDef(HASensor, "BSZ Verdichter Betriebsst. ges", "counter", dict(device_class=HADeviceClassSensor.DURATION, unit_of_measurement="h", icon="mdi:wrench-clock", suggested_display_precision=0), limits=COUNTER_LIMITS),
+    SensorDef(HASensor, "BSZ Verdichter Betriebsst. HKR", "counter", dict(device_class=HADeviceClassSensor.DURATION, unit_of_measurement="h", icon="mdi:wrench-clock", suggested_display_precision=0), limits=COUNTER_LIMITS),
+    SensorDef(HASensor, "BSZ Verdichter Betriebsst. WW", "counter", dict(device_class=HADeviceClassSensor.DURATION, unit_of_measurement="h", icon="mdi:wrench-clock", suggested_display_precision=0), limits=COUNTER_LIMITS),
+    SensorDef(HASensor, "BSZ Verdichter Schaltung WW", "counter", dict(icon="mdi:counter"), limits=COUNTER_LIMITS),
+    SensorDef(HASensor, "BSZ Verdichter Schaltungen", "counter", dict(icon="mdi:counter"), limits=COUNTER_LIMITS),
+    SensorDef(HASensor, "BSZ WWV Betriebsstunden", "counter", dict(device_class=HADeviceClassSensor.DURATION, unit_of_measurement="h", icon="mdi:wrench-clock"), limits=COUNTER_LIMITS),
+    SensorDef(HASensor, "BSZ WWV Schaltungen", "counter", dict(icon="mdi:counter"), limits=COUNTER_LIMITS),
+    SensorDef(HASensor, "BSZ ZIPWW Betriebsstunden", "counter", dict(device_class=HADeviceClassSensor.DURATION, unit_of_measurement="h", icon="mdi:wrench-clock"), limits=COUNTER_LIMITS),
+    SensorDef(HASensor, "BSZ ZIPWW Schaltungen", "counter", dict(icon="mdi:counter"), limits=COUNTER_LIMITS),
+    SensorDef(HASensor, "Energiezaehler", "counter", dict(icon="mdi:counter"), limits=COUNTER_LIMITS),
+    SensorDef(HABinarySensor, "EQ Pumpe (Ventilator)", "normal", dict(device_class=HADeviceClassBinarySensor.RUNNING, icon="mdi:pump")),
+    SensorDef(HASensor, "Frischwasserpumpe", "normal", dict()),
+    SensorDef(HABinarySensor, "FWS Stroemungsschalter", "normal", dict(device_class=HADeviceClassBinarySensor.RUNNING, icon="mdi:light-switch-off")),
+    SensorDef(HABinarySensor, "FWS Type", "setpoint", dict()),
+    SensorDef(HABinarySensor, "Hauptschalter", "normal", dict(device_class=HADeviceClassBinarySensor.RUNNING, icon="mdi:light-switch-off")),
+    SensorDef(HABinarySensor, "Heizkreispumpe", "normal", dict(device_class=HADeviceClassBinarySensor.RUNNING, icon="mdi:pump")),
+    SensorDef(HASensor, "HKR Absenktemp. (K)", "setpoint", dict(device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="K", icon="mdi:thermometer-chevron-down", suggested_display_precision=0)),
+    SensorDef(HASensor, "HKR Aufheiztemp. (K)", "setpoint", dict(device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="K", icon="mdi:thermometer-chevron-up", suggested_display_precision=0)),
+    SensorDef(HASensor, "HKR Heizgrenze", "setpoint", dict(device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer-high")),
+    SensorDef(HASensor, "HKR RLT Soll_0 (Heizkurve)", "setpoint", dict(device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer-lines")),
+    SensorDef(HASensor, "HKR RLT Soll_oHG (Heizkurve)", "setpoint", dict(device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer-lines")),
+    SensorDef(HASensor, "HKR RLT Soll_uHG (Heizkurve)", "setpoint", dict(device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer-lines")),
+    SensorDef(HASensor, "HKR Soll_Raum", "setpoint", dict(device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:home-thermometer-outline")),
+    SensorDef(HASensor, "HKR_Sollwert", "normal", dict(device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:home-thermometer-outline")),
+    SensorDef(HASensor, "Hochdruck (bar)", "normal", dict(device_class=HADeviceClassSensor.PRESSURE, unit_of_measurement="bar", icon="mdi:gauge")),
+    SensorDef(HASensor, "Niederdruck (bar)", "normal", dict(device_class=HADeviceClassSensor.PRESSURE, unit_of_measurement="bar", icon="mdi:gauge")),
+    SensorDef(HABinarySensor, "Puffer Type", "setpoint", dict()),
+    SensorDef(HABinarySensor, "Stoerung", "fast", dict(device_class=HADeviceClassBinarySensor.PROBLEM, icon="mdi:alert")),
+    SensorDef(HASensor, "Temp. Aussen", "normal", dict(device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer"), limits=TEMPERATURE_LIMITS),
+    SensorDef(HASensor, "Temp. Aussen verzoegert", "normal", dict(device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer"), limits=TEMPERATURE_LIMITS),
+    SensorDef(HASensor, "Temp. Brauchwasser", "fast", dict(device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer"), limits=TEMPERATURE_LIMITS),
+    SensorDef(HASensor, "Temp. EQ_Austritt", "normal", dict(device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer"), limits=TEMPERATURE_LIMITS),
+    SensorDef(HASensor, "Temp. EQ_Eintritt", "normal", dict(device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer"), limits=TEMPERATURE_LIMITS),
+    SensorDef(HASensor, "Temp. Frischwasser_Istwert", "normal", dict(device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer"), limits=TEMPERATURE_LIMITS),
+    SensorDef(HASensor, "Temp. Heissgas", "normal", dict(device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer"), limits=TEMPERATURE_LIMITS),
+    SensorDef(HASensor, "Temp. Kondensation", "normal", dict(device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer"), limits=TEMPERATURE_LIMITS),
+    SensorDef(HASensor, "Temp. Ruecklauf", "fast", dict(device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer"), limits=TEMPERATURE_LIMITS),
+    SensorDef(HASensor, "Temp. Sauggas", "normal", dict(device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer"), limits=TEMPERATURE_LIMITS),
+    SensorDef(HASensor, "Temp. Verdampfung", "normal", dict(device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer"), limits=TEMPERATURE_LIMITS),
+    SensorDef(HASensor, "Temp. Vorlauf", "fast", dict(device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer"), limits=TEMPERATURE_LIMITS),
+    SensorDef(HABinarySensor, "Verdichter", "fast", dict(device_class=HADeviceClassBinarySensor.RUNNING, icon="mdi:pump")),
+    SensorDef(HASensor, "Verdichter Einschaltverz.(sec)", "normal", dict(device_class=HADeviceClassSensor.DURATION, unit_of_measurement="s", icon="mdi:timer-lock-outline")),
+    SensorDef(HASensor, "Verdichter laeuft seit", "normal", dict(device_class=HADeviceClassSensor.DURATION, unit_of_measurement="h", icon="mdi:wrench-clock")),
+    SensorDef(HASensor, "Verdichter_Status", "normal", dict()),
+    SensorDef(HASensor, "Verdichteranforderung", "normal", dict()),
+    SensorDef(HABinarySensor, "Warmwasservorrang", "normal", dict(device_class=HADeviceClassBinarySensor.RUNNING, icon="mdi:priority-high")),
+    SensorDef(HASensor, "WP_System", "setpoint", dict()),
+    SensorDef(HASensor, "WW Hysterese Minimaltemp.", "setpoint", dict(device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer-water")),
+    SensorDef(HASensor, "WW Hysterese Normaltemp.", "setpoint", dict(device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer-water")),
+    SensorDef(HASensor, "WW Minimaltemp.", "setpoint", dict(device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer-water")),
+    SensorDef(HASensor, "WW Normaltemp.", "setpoint", dict(device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer-water")),
+    SensorDef(HASensor, "WW Type", "setpoint", dict()),
+    SensorDef(HABinarySensor, "Zirkulationspumpe WW", "normal", dict(device_class=HADeviceClassBinarySensor.RUNNING, icon="mdi:pump")),
+]
+
+#key of a parameter in the values payload, same as the one home assistant uses in its templates
+def normalizeKey(name: str) -> str:
+    return re.sub(r'[^A-Za-z]', '', name).lower()
+
+def pollGroups() -> dict:
+    return {sensorDef.name: sensorDef.pollGroup for sensorDef in SENSORS}
+
+#sensors of the aggregation stage: numeric ones or ones with states (binary and enum sensors)
+def aggregateKeys() -> dict:
+    keys = {}
+    for sensorDef in SENSORS:
+        if sensorDef.pollGroup not in AGGREGATE_GROUPS:
+            continue
+        if sensorDef.classType is HABinarySensor or sensorDef.enumMap is not None:
+            keys[normalizeKey(sensorDef.name)] = "state"
+        else:
+            keys[normalizeKey(sensorDef.name)] = "numeric"
+    return keys
+
+def sensorDeadbands() -> dict:
+    deadbands = {}
+    for sensorDef in SENSORS:
+        deadband = sensorDef.deadband
+        if deadband is None:
+            deadband = DEADBANDS.get(sensorDef.options.get("device_class"), 0.)
+        deadbands[normalizeKey(sensorDef.name)] = deadband
+    return deadbands
+
+#availability of the entities of a pump and its mode: the pump is online and, with a bridgeTopic, the bridge too
+def baseAvailability(nodeId: str, bridgeTopic: str = None) -> tuple:
+    avail = [HAAvailability(topic=nodeId + "/state")]
+    if bridgeTopic is None:
+        return avail, None
+    avail.append(HAAvailability(topic=bridgeTopic + "/state"))
+    return avail, "all"
+
+#with perSensorTopics every sensor reads its own retained topic <nodeId>/values/<key>
+#instead of the common json payload on <nodeId>/values
+#with a bridgeTopic the sensors are only available if the bridge and the pump are online
+#with compactKeys (key -> short key) the json payload is the compact one with typed values
+def createSensors(nodeId: str, hadevice: HADevice, qos: int, perSensorTopics: bool = False, bridgeTopic: str = None, compactKeys: dict = None):
     
     def createBlueprint(classType: Type, nodeId: str, device: HADevice, name: str, **kwargs):
         # Check if classType is a known class
         if isinstance(classType, type):
             
-            avail = HAAvailability(topic=nodeId + "/state")
+            key = normalizeKey(name)
+            avail = baseAvailability(nodeId, bridgeTopic)[0]
+
+            #a parameter that could not be read is published as None, its sensor is unavailable until the next valid value
+            if perSensorTopics:
+                kwargs.setdefault("state_topic", nodeId + "/values/" + key)
+                kwargs.setdefault("value_template", "{{ value }}")
+                avail.append(HAAvailability(topic=kwargs["state_topic"], value_template="{{ 'offline' if value == '' else 'online' }}"))
+            elif compactKeys is not None:
+                kwargs.setdefault("state_topic", nodeId + "/values")
+                value = "value_json['" + compactKeys[key] + "']"
+                if classType is HABinarySensor:
+                    kwargs.setdefault("value_template", "{{ 'ON' if " + value + " else 'OFF' }}")
+                else:
+                    kwargs.setdefault("value_template", "{{ " + value + " }}")
+                avail.append(HAAvailability(topic=kwargs["state_topic"], value_template="{{ 'offline' if " + value + " is none else 'online' }}"))
+            else:
+                kwargs.setdefault("state_topic", nodeId + "/values")
+                avail.append(HAAvailability(topic=kwargs["state_topic"], value_template="{{ 'offline' if value_json." + key + " is none else 'online' }}"))
+            kwargs.setdefault("availability_mode", "all")
 
             # Create instance of wanted class
             return classType(
-                state_topic=nodeId + "/values",
                 node_id=nodeId,
                 name=name,
                 device=device,
@@ -24,64 +214,89 @@ def createSensors(nodeId: str, hadevice: HADevice, qos: int):
 
     sensors = []
 
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "Betriebsart", device_class=HADeviceClassSensor.ENUM, icon="mdi:knob"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "BSZ EQ Betriebsstunden", device_class=HADeviceClassSensor.DURATION, unit_of_measurement="h", icon="mdi:wrench-clock", suggested_display_precision=0))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "BSZ EQ Schaltungen", icon="mdi:counter", suggested_display_precision=0))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "BSZ HKP Betriebsstunden", device_class=HADeviceClassSensor.DURATION, unit_of_measurement="h", icon="mdi:wrench-clock", suggested_display_precision=0))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "BSZ HKP Schaltung", icon="mdi:counter", suggested_display_precision=0))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "BSZ Verdichter akt. Laufzeit", device_class=HADeviceClassSensor.DURATION, unit_of_measurement="s", icon="mdi:wrench-clock", suggested_display_precision=0))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "BSZ Verdichter Betriebsst. ges", device_class=HADeviceClassSensor.DURATION, unit_of_measurement="h", icon="mdi:wrench-clock", suggested_display_precision=0))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "BSZ Verdichter Betriebsst. HKR", device_class=HADeviceClassSensor.DURATION, unit_of_measurement="h", icon="mdi:wrench-clock", suggested_display_precision=0))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "BSZ Verdichter Betriebsst. WW", device_class=HADeviceClassSensor.DURATION, unit_of_measurement="h", icon="mdi:wrench-clock", suggested_display_precision=0))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "BSZ Verdichter Schaltung WW", icon="mdi:counter"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "BSZ Verdichter Schaltungen", icon="mdi:counter"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "BSZ WWV Betriebsstunden", device_class=HADeviceClassSensor.DURATION, unit_of_measurement="h", icon="mdi:wrench-clock"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "BSZ WWV Schaltungen", icon="mdi:counter"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "BSZ ZIPWW Betriebsstunden", device_class=HADeviceClassSensor.DURATION, unit_of_measurement="h", icon="mdi:wrench-clock"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "BSZ ZIPWW Schaltungen", icon="mdi:counter"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "Energiezaehler", icon="mdi:counter"))
-    sensors.append(createBlueprint(HABinarySensor, nodeId, hadevice, "EQ Pumpe (Ventilator)", device_class=HADeviceClassBinarySensor.RUNNING, icon="mdi:pump"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "Frischwasserpumpe"))
-    sensors.append(createBlueprint(HABinarySensor, nodeId, hadevice, "FWS Stroemungsschalter", device_class=HADeviceClassBinarySensor.RUNNING, icon="mdi:light-switch-off"))
-    sensors.append(createBlueprint(HABinarySensor, nodeId, hadevice, "FWS Type"))
-    sensors.append(createBlueprint(HABinarySensor, nodeId, hadevice, "Hauptschalter", device_class=HADeviceClassBinarySensor.RUNNING, icon="mdi:light-switch-off"))
-    sensors.append(createBlueprint(HABinarySensor, nodeId, hadevice, "Heizkreispumpe", device_class=HADeviceClassBinarySensor.RUNNING, icon="mdi:pump"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "HKR Absenktemp. (K)", device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="K", icon="mdi:thermometer-chevron-down", suggested_display_precision=0))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "HKR Aufheiztemp. (K)", device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="K", icon="mdi:thermometer-chevron-up", suggested_display_precision=0))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "HKR Heizgrenze", device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer-high"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "HKR RLT Soll_0 (Heizkurve)", device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer-lines"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "HKR RLT Soll_oHG (Heizkurve)", device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer-lines"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "HKR RLT Soll_uHG (Heizkurve)", device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer-lines"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "HKR Soll_Raum", device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:home-thermometer-outline"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "HKR_Sollwert", device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:home-thermometer-outline"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "Hochdruck (bar)", device_class=HADeviceClassSensor.PRESSURE, unit_of_measurement="bar", icon="mdi:gauge"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "Niederdruck (bar)", device_class=HADeviceClassSensor.PRESSURE, unit_of_measurement="bar", icon="mdi:gauge"))
-    sensors.append(createBlueprint(HABinarySensor, nodeId, hadevice, "Puffer Type"))
-    sensors.append(createBlueprint(HABinarySensor, nodeId, hadevice, "Stoerung", device_class=HADeviceClassBinarySensor.PROBLEM, icon="mdi:alert"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "Temp. Aussen", device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "Temp. Aussen verzoegert", device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "Temp. Brauchwasser", device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "Temp. EQ_Austritt", device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "Temp. EQ_Eintritt", device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "Temp. Frischwasser_Istwert", device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "Temp. Heissgas", device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "Temp. Kondensation", device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "Temp. Ruecklauf", device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "Temp. Sauggas", device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "Temp. Verdampfung", device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "Temp. Vorlauf", device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer"))
-    sensors.append(createBlueprint(HABinarySensor, nodeId, hadevice, "Verdichter", device_class=HADeviceClassBinarySensor.RUNNING, icon="mdi:pump"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "Verdichter Einschaltverz.(sec)", device_class=HADeviceClassSensor.DURATION, unit_of_measurement="s", icon="mdi:timer-lock-outline"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "Verdichter laeuft seit", device_class=HADeviceClassSensor.DURATION, unit_of_measurement="h", icon="mdi:wrench-clock"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "Verdichter_Status"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "Verdichteranforderung"))
-    sensors.append(createBlueprint(HABinarySensor, nodeId, hadevice, "Warmwasservorrang", device_class=HADeviceClassBinarySensor.RUNNING, icon="mdi:priority-high"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "WP_System"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "WW Hysterese Minimaltemp.", device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer-water"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "WW Hysterese Normaltemp.", device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer-water"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "WW Minimaltemp.", device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer-water"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "WW Normaltemp.", device_class=HADeviceClassSensor.TEMPERATURE, unit_of_measurement="°C", icon="mdi:thermometer-water"))
-    sensors.append(createBlueprint(HASensor, nodeId, hadevice, "WW Type"))
-    sensors.append(createBlueprint(HABinarySensor, nodeId, hadevice, "Zirkulationspumpe WW", device_class=HADeviceClassBinarySensor.RUNNING, icon="mdi:pump"))
+    for sensorDef in SENSORS:
+        sensors.append(createBlueprint(sensorDef.classType, nodeId, hadevice, sensorDef.name, **sensorDef.options))
+
+    return sensors
+
+#entities for the windowed values on <nodeId>/aggregate next to the ones of createSensors
+def createAggregateSensors(nodeId: str, hadevice: HADevice, qos: int, bridgeTopic: str = None):
+
+    avail, availabilityMode = baseAvailability(nodeId, bridgeTopic)
+
+    #a sensor without samples in the window is unavailable instead of showing "None"
+    def createAggregate(name: str, template: str, key: str = None, **kwargs):
+        availability = avail
+        mode = availabilityMode
+        if key is not None:
+            availability = avail + [HAAvailability(topic=nodeId + "/aggregate", value_template="{{ 'online' if value_json." + key + " is defined else 'offline' }}")]
+            mode = "all"
+        return HASensor(
+            state_topic=nodeId + "/aggregate",
+            node_id=nodeId,
+            name=name,
+            device=hadevice,
+            qos=qos,
+            availability=availability,
+            availability_mode=mode,
+            value_template=template,
+            **kwargs
+        )
+
+    keys = aggregateKeys()
+    sensors = []
+
+    for sensorDef in SENSORS:
+        key = normalizeKey(sensorDef.name)
+        kind = keys.get(key)
+
+        if kind == "numeric":
+            options = {option: sensorDef.options[option] for option in ("device_class", "unit_of_measurement", "icon") if option in sensorDef.options}
+            for stat in ("min", "max", "mean", "last"):
+                template = "{{ (value_json." + key + " | default({}))." + stat + " | default(none) }}"
+                sensors.append(createAggregate(sensorDef.name + " " + stat, template, key, **options))
+
+        elif kind == "state":
+            if sensorDef.enumMap is not None:
+                states = list(sensorDef.enumMap.values())
+            else:
+                states = ["ON"]
+
+            for state in states:
+                template = "{{ (value_json." + key + " | default({}))['" + state + "'] | default(0) }}"
+                sensors.append(createAggregate(sensorDef.name + " " + state + " time", template, device_class=HADeviceClassSensor.DURATION, unit_of_measurement="s", icon="mdi:timer-outline"))
 
     return sensors
+
+#entities for the periodic diagnostics on <nodeId>/diagnostics
+def createDiagnosticSensors(nodeId: str, hadevice: HADevice, qos: int, bridgeTopic: str = None):
+
+    avail, availabilityMode = baseAvailability(nodeId, bridgeTopic)
+
+    sensors = []
+    for name, key, options in DIAGNOSTICS:
+        sensors.append(HASensor(
+            state_topic=nodeId + "/diagnostics",
+            node_id=nodeId,
+            name=name,
+            device=hadevice,
+            qos=qos,
+            availability=avail,
+            availability_mode=availabilityMode,
+            entity_category="diagnostic",
+            value_template="{{ value_json." + key + " }}",
+            **options
+        ))
+
+    return sensors
+
+#entities for the newest entry of the fault list on <nodeId>/last_fault, with its error code and index as attributes
+def createFaultSensors(nodeId: str, hadevice: HADevice, qos: int, bridgeTopic: str = None):
+
+    avail, availabilityMode = baseAvailability(nodeId, bridgeTopic)
+
+    options = dict(state_topic=nodeId + "/last_fault", node_id=nodeId, device=hadevice, qos=qos, availability=avail, availability_mode=availabilityMode)
+    return [
+        HASensor(name="Last fault", value_template="{{ value_json.message }}", json_attributes_topic=nodeId + "/last_fault", icon="mdi:alert-circle-outline", **options),
+        HASensor(name="Last fault time", value_template="{{ value_json.datetime }}", device_class=HADeviceClassSensor.TIMESTAMP, icon="mdi:clock-alert-outline", **options),
+    ]
@@ -0,0 +1,213 @@
+import time
+import logging
+
+from htheatpump.htheatpump import HtHeatpump
+from htheatpump.htparams import HtParams
+from htheatpump.utils import Timer
+from metrics import PARAM_READ_FAILURES, PARAM_READ_SECONDS, PARAMS_QUARANTINED, READ_RETRIES
+
+#observed round trip, failures and quarantine of one parameter
+class ParamState:
+
+    def __init__(self) -> None:
+        self.latency = None
+        self.failures = 0
+        self.backoff = 0.
+        self.until = 0.
+
+#fault isolation per parameter: a timeout and retries that follow the observed latency,
+#and a quarantine with exponential backoff for parameters that keep failing
+#the timeout of a read is timeoutFactor times its average round trip within [minTimeout, maxTimeout],
+#the typical round trip of all parameters stands in for one that never answered yet,
+#retries of a cycle share retryBudget seconds, each one costs the timeout of its parameter
+class ParamHealth:
+
+    def __init__(self, minTimeout: float = 0.5, maxTimeout: float = 5.0, timeoutFactor: float = 4.0, maxRetries: int = 2,
+                 retryBudget: float = 5.0, quarantineAfter: int = 3, backoffMin: float = 60., backoffMax: float = 3600.) -> None:
+        self.minTimeout = minTimeout
+        self.maxTimeout = maxTimeout
+        self.timeoutFactor = timeoutFactor
+        self.maxRetries = maxRetries
+        self.retryBudget = retryBudget
+        self.quarantineAfter = quarantineAfter
+        self.backoffMin = backoffMin
+        self.backoffMax = backoffMax
+
+        self._states = {}
+        self._typical = None
+
+    def _state(self, name: str) -> ParamState:
+        state = self._states.get(name)
+        if state is None:
+            state = self._states[name] = ParamState()
+        return state
+
+    def timeout(self, name: str) -> float:
+        latency = self._state(name).latency
+        if latency is None:
+            latency = self._typical
+        if latency is None:
+            return self.maxTimeout
+        return min(self.maxTimeout, max(self.minTimeout, latency * self.timeoutFactor))
+
+    #False while the parameter is quarantined, afterwards one read probes it again
+    def available(self, name: str, now: float = None) -> bool:
+        if now is None:
+            now = time.monotonic()
+        return now >= self._state(name).until
+
+    def quarantined(self, now: float = None) -> list:
+        if now is None:
+            now = time.monotonic()
+        return [name for name, state in self._states.items() if now < state.until]
+
+    def success(self, name: str, seconds: float) -> None:
+        state = self._state(name)
+        #exponentially weighted average, a single slow answer doesn't double the timeout
+        state.latency = seconds if state.latency is None else state.latency * 0.8 + seconds * 0.2
+        self._typical = seconds if self._typical is None else self._typical * 0.95 + seconds * 0.05
+        if state.backoff > 0:
+            logging.info("parameter '%s' is readable again", name)
+        state.failures = 0
+        state.backoff = 0.
+        state.until = 0.
+
+    def failure(self, name: str, now: float = None) -> None:
+        if now is None:
+            now = time.monotonic()
+        state = self._state(name)
+        state.failures += 1
+        if state.failures >= self.quarantineAfter:
+            state.backoff = min(self.backoffMax, state.backoff * 2 if state.backoff else self.backoffMin)
+            state.until = now + state.backoff
+            logging.warning("parameter '%s' failed %d times in a row, skipping it for %.0f seconds", name, state.failures, state.backoff)
+
+#read the given parameters (all known parameters if None) from the heat pump
+#in bulk mode all MP data points are requested with a few MR frames via fast_query(),
+#only SP parameters and MP data points of a failed bulk request are read one by one
+#the round trip of every request is recorded per parameter under the label device
+#with health, single reads are isolated: a failed or quarantined parameter is missing in the result,
+#IOError is only raised if every attempted read failed
+#quarantined parameters are left out of the MR frames too, and the bulk request itself is health
+#entry "fast_query": after quarantineAfter failures in a row it is skipped for a while, then the
+#single reads find and quarantine the data point that broke it
+def queryParams(hp: HtHeatpump, names: list = None, bulk: bool = False, device: str = "", health: ParamHealth = None) -> dict:
+    if names is None:
+        names = list(HtParams.keys())
+
+    if health is not None:
+        names = [name for name in names if health.available(name)]
+
+    if not bulk:
+        return singleQuery(hp, names, device, health)
+
+    values = {}
+
+    mpNames = [name for name in names if HtParams[name].dp_type == "MP"]
+    if mpNames and (health is None or health.available("fast_query")):
+        try:
+            with Timer() as timer:
+                if health is not None:
+                    #the timeout applies to every frame of the answer
+                    values.update(withTimeout(hp, health.timeout("fast_query"), hp.fast_query, *mpNames))
+                else:
+                    values.update(hp.fast_query(*mpNames))
+            PARAM_READ_SECONDS.observe(timer.elapsed, device=device, param="fast_query")
+            if health is not None:
+                health.success("fast_query", timer.elapsed)
+        except Exception as ex:
+            logging.warning("fast query of %d MP data points failed, falling back to single queries: %s", len(mpNames), ex)
+            READ_RETRIES.inc(device=device)
+            if health is not None:
+                PARAM_READ_FAILURES.inc(device=device, param="fast_query")
+                health.failure("fast_query")
+            #there may be unread responses left on the bus, start with clean buffers
+            resync(hp)
+
+    remaining = [name for name in names if name not in values]
+    if remaining:
+        values.update(singleQuery(hp, remaining, device, health))
+
+    #keep the order of the request
+    return {name: values[name] for name in names if name in values}
+
+#set the quarantine gauge of device to the parameters health skips right now
+def exportQuarantine(health: ParamHealth, device: str = "") -> None:
+    quarantined = set(health.quarantined())
+    for labels, value in PARAMS_QUARANTINED.series(device=device):
+        if value and labels["param"] not in quarantined:
+            PARAMS_QUARANTINED.set(0., device=device, param=labels["param"])
+    for name in quarantined:
+        PARAMS_QUARANTINED.set(1., device=device, param=name)
+
+#same as hp.query(), but timing each parameter
+def singleQuery(hp: HtHeatpump, names: list, device: str = "", health: ParamHealth = None) -> dict:
+    values = {}
+
+    if health is None:
+        for name in names:
+            with Timer() as timer:
+                values[name] = hp.get_param(name)
+            PARAM_READ_SECONDS.observe(timer.elapsed, device=device, param=name)
+        return values
+
+    budget = health.retryBudget
+    failed = []
+    for name in names:
+        attempt = 0
+        while True:
+            try:
+                with Timer() as timer:
+                    values[name] = withTimeout(hp, health.timeout(name), hp.get_param, name)
+                PARAM_READ_SECONDS.observe(timer.elapsed, device=device, param=name)
+                health.success(name, timer.elapsed)
+                break
+            except Exception as ex:
+                #there may be a late or partial response left on the bus
+                resync(hp)
+
+                cost = health.timeout(name)
+                if attempt < health.maxRetries and budget >= cost:
+                    budget -= cost
+                    attempt += 1
+                    READ_RETRIES.inc(device=device)
+                    logging.debug("retrying parameter '%s' after: %s", name, ex)
+                    continue
+
+                PARAM_READ_FAILURES.inc(device=device, param=name)
+                health.failure(name)
+                failed.append(name)
+                break
+
+    if failed:
+        if not values:
+            raise IOError("reading all %d parameters failed" % len(failed))
+        logging.warning("reading %d of %d parameters failed: %s", len(failed), len(names), ", ".join(failed))
+    return values
+
+#reconnect and login after a failed request, a failure here is logged and left to the next request
+#instead of losing the rest of the cycle
+def resync(hp: HtHeatpump) -> None:
+    try:
+        hp.reconnect()
+        hp.login()
+    except Exception as ex:
+        logging.warning("reconnecting to the heat pump failed: %s", ex)
+
+#the pyserial port of an open connection, None if there is none
+#htheatpump has no per-request timeout, HtHeatpump 1.3 (pinned in requirements.txt) keeps the port in _ser
+def serialPort(hp: HtHeatpump):
+    return getattr(hp, "_ser", None)
+
+#run func(*args) with its own read timeout on the serial port
+def withTimeout(hp: HtHeatpump, timeout: float, func, *args):
+    ser = serialPort(hp)
+    if ser is None:
+        return func(*args)
+
+    default = ser.timeout
+    ser.timeout = timeout
+    try:
+        return func(*args)
+    finally:
+        ser.timeout = default
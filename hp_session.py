@@ -0,0 +1,125 @@
+import time
+import logging
+import threading
+
+from htheatpump.htheatpump import HtHeatpump
+from htheatpump.utils import Timer
+from metrics import LOGIN_SECONDS
+
+#owns the one serial connection to the heat pump and keeps it logged in
+#all access goes through execute(), which serializes the callers with a lock,
+#so frames of different callers never interleave on the bus
+class HpSession:
+
+    def __init__(self, device: str, baudrate: int, keepaliveInterval: float = 30.0, backoffMin: float = 2.0, backoffMax: float = 300.0) -> None:
+        self.device = device
+        self.baudrate = baudrate
+        self.keepaliveInterval = keepaliveInterval
+        self.backoffMin = backoffMin
+        self.backoffMax = backoffMax
+
+        self._hp = HtHeatpump(device, baudrate=baudrate)
+        self._lock = threading.RLock()
+        self._loggedIn = False
+        self._lastActivity = 0.
+        self._backoff = 0.
+        self._nextAttempt = 0.
+
+        self._stopEvent = threading.Event()
+        self._keepaliveThread = None
+
+    def start(self) -> None:
+        if self.keepaliveInterval > 0 and self._keepaliveThread is None:
+            self._stopEvent.clear()
+            self._keepaliveThread = threading.Thread(target=self._keepaliveLoop, name="hp-keepalive " + self.device, daemon=True)
+            self._keepaliveThread.start()
+
+    def stop(self) -> None:
+        self._stopEvent.set()
+        if self._keepaliveThread is not None:
+            self._keepaliveThread.join()
+            self._keepaliveThread = None
+
+        with self._lock:
+            self._disconnect()
+
+    #open and log in ahead of the first request, returns False if the heat pump didn't answer
+    def open(self) -> bool:
+        with self._lock:
+            try:
+                self._ensureConnected()
+            except Exception as ex:
+                logging.warning("heat pump session on %s not ready: %s", self.device, ex)
+                return False
+            self._lastActivity = time.monotonic()
+            return True
+
+    #run func(hp) on the logged in session, connect first if necessary
+    def execute(self, func, *args, **kwargs):
+        with self._lock:
+            self._ensureConnected()
+            try:
+                result = func(self._hp, *args, **kwargs)
+            except Exception:
+                #the state of the bus is unknown now, start over with a fresh handshake
+                self._fail()
+                raise
+            self._lastActivity = time.monotonic()
+            return result
+
+    def _ensureConnected(self) -> None:
+        if self._loggedIn:
+            return
+
+        now = time.monotonic()
+        if now < self._nextAttempt:
+            raise IOError("heat pump session on %s unavailable, next connection attempt in %.0f seconds" % (self.device, self._nextAttempt - now))
+
+        try:
+            logging.debug("opening heat pump session on %s", self.device)
+            with Timer() as timer:
+                self._hp.open_connection()
+                self._hp.login()
+        except Exception:
+            self._fail()
+            raise
+
+        LOGIN_SECONDS.observe(timer.elapsed, device=self.device)
+
+        self._loggedIn = True
+        self._backoff = 0.
+        self._nextAttempt = 0.
+        self._lastActivity = time.monotonic()
+        logging.info("heat pump session on %s established", self.device)
+
+    def _fail(self) -> None:
+        self._disconnect()
+
+        #exponential backoff between reconnects, only after a real failure
+        self._backoff = min(self.backoffMax, self._backoff * 2 if self._backoff else self.backoffMin)
+        self._nextAttempt = time.monotonic() + self._backoff
+        logging.warning("heat pump session on %s failed, reconnecting in %.0f seconds", self.device, self._backoff)
+
+    def _disconnect(self) -> None:
+        if self._loggedIn:
+            self._hp.logout()  # try to logout for an ordinary cancellation (if possible)
+        self._loggedIn = False
+        self._hp.close_connection()
+
+    def _keepaliveLoop(self) -> None:
+        while not self._stopEvent.wait(self.keepaliveInterval / 2):
+            #only talk to the pump if nobody else did recently
+            if not self._loggedIn or time.monotonic() - self._lastActivity < self.keepaliveInterval:
+                continue
+
+            #don't wait for a running caller, it keeps the session alive anyway
+            if not self._lock.acquire(blocking=False):
+                continue
+            try:
+                if self._loggedIn:
+                    logging.debug("heat pump keepalive on %s", self.device)
+                    self.execute(HtHeatpump.get_serial_number)
+            except Exception as ex:
+                logging.warning("heat pump keepalive on %s failed: %s", self.device, ex)
+            finally:
+                self._lock.release()
@@ -1,36 +1,82 @@
 #!/usr/bin/env python3
 
 import time
+import asyncio
 import paho.mqtt.client as mqtt
 import argparse
 import signal
 import logging
 import json
-import re
 
 from logging.handlers import TimedRotatingFileHandler
 from htheatpump.htheatpump import HtHeatpump
 from htheatpump.htparams import HtDataTypes, HtParams
 from htheatpump.utils import Timer
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from pathlib import Path
 from ha_sensors import *
+from hp_session import HpSession
+from hp_query import ParamHealth, exportQuarantine, queryParams
+from poll_scheduler import PollScheduler, loadPollIntervals
+from mqtt_publisher import ChangePublisher
+from mqtt_async import AsyncMqttClient
+from offline_buffer import OfflineBuffer
+from aggregation import Aggregator
+from discovery_cache import DiscoveryCache, MessageRecorder, hashMessages
+from identity_cache import IdentityCache
+from fault_sync import FaultListSync
+from payload_codec import PAYLOAD_FORMATS, PayloadEncoder
+from snapshot_cache import SnapshotCache, serveSnapshots
+from metrics import CLOCK_CORRECTIONS, CLOCK_DRIFT_SECONDS, MQTT_CONNECTS, MQTT_RECONNECTS, PUBLISH_SECONDS, QUERY_SECONDS, READ_FAILURES, TRANSFORM_SECONDS, DiagnosticsWindow, serveMetrics
+from value_transform import applyTransforms, buildTransforms
 
 from mqtt_homeassistant_utils import HADevice
 
 #global Variables
-loopEnabled = True
-HP_DEVICE = ""
-HP_BAUD = ""
+HP_PUMPS = []
+#baud rates the heat pump can be configured to
+HP_BAUDRATES = [9600, 19200, 38400, 57600, 115200]
+HP_KEEPALIVE = 0
+HP_BULK = False
+HP_POLL_CONFIG = None
+HP_FAULT_INTERVAL = 0
+STATE_DIR = None
 
 MQTT_CLIENT_IDENTIFIER = ""
-MQTT_TOPIC = ""
 MQTT_BROKER_ADDRESS = ""
 MQTT_PORT = 0
 MQTT_QOS = 0
 MQTT_USER = ""
 MQTT_PASS = ""
-HADEVICE = None
+MQTT_PUBLISH_MODE = "snapshot"
+MQTT_PAYLOAD_FORMAT = "json"
+MQTT_HEARTBEAT = 0
+MQTT_BRIDGE_TOPIC = None
+HA_STATUS_TOPIC = "homeassistant/status"
+BUFFER_ENABLED = False
+BUFFER_MAX_ENTRIES = 0
+BUFFER_MAX_AGE = 0
+BUFFER_RATE = 0
+AGGREGATE_WINDOW = 0
+AGGREGATE_ONLY = False
+METRICS_HOST = ""
+METRICS_PORT = 0
+DIAGNOSTICS_INTERVAL = 0
+API_HOST = ""
+API_PORT = 0
+API_SOCKET = None
+API_READ_SPACING = 10.
+OFFLINEBUFFER = None
+DISCOVERYCACHE = None
+IDENTITYCACHE = None
+FAULTSYNC = None
+#seconds between reads of the identity after a failure, and between refreshes after a success
+IDENTITY_RETRY_MIN = 30
+IDENTITY_RETRY_MAX = 3600
+IDENTITY_REFRESH = 86400
+PUMPS = []
+TRANSFORMS = {}
 
 def configureLogger() -> None:
     logger = logging.getLogger()
@@ -40,195 +86,282 @@ def configureLogger() -> None:
     handler.setFormatter(formatter)
     logger.addHandler(handler)
 
-#handle ctrl+c in terminal session
-def signalHandler(signal, frame):
-    global loopEnabled
-    logging.debug("Got quit signal")
-    #print to stdout for user
-    print("Got quit signal, cleaning up...")
-    loopEnabled = False
-
-#Read general information
-def readDeviceInfo() -> HADevice:
-    hp = HtHeatpump(HP_DEVICE, baudrate=HP_BAUD)
-    try:
-        
-        hp.open_connection()
-        hp.login()
-
-        version = hp.get_version()
-        sn = str(hp.get_serial_number())
-
-        device = HADevice(
-            manufacturer="Heliotherm", 
-            model="Basic Comfort",
-            name="Heliotherm Heat Pump",
-            sw_version=version[0],
-            identifiers=[sn]
-        )
-
-    except Exception as ex:
-        device = HADevice(
-            manufacturer="Heliotherm", 
-            model="Unknown",
-            name="Heliotherm Heat Pump"
-        )
-
-    finally:
-        hp.logout()  # try to logout for an ordinary cancellation (if possible)
-        hp.close_connection()
-
-    return device
+#everything that belongs to one heat pump on its own serial port
+class HeatPump:
+
+    def __init__(self, device: str, baudrate: int, topic: str, pollIntervals: dict, name: str = "Heliotherm Heat Pump") -> None:
+        self.device = device
+        self.baudrate = baudrate
+        self.topic = topic
+        self.name = name
+
+        #one long-lived session to the heat pump, shared by all readers
+        self.session = HpSession(device, baudrate, keepaliveInterval=HP_KEEPALIVE)
+        #timeouts, retries and quarantine per parameter
+        self.health = ParamHealth()
+        self.hadevice = None
+        self.discovery = None
+        self.discoveryDevice = None
+        self.scheduler = PollScheduler(pollIntervals, requestSpacing=API_READ_SPACING)
+        #set when parameters are requested outside of their schedule
+        self.wakeup = asyncio.Event()
+
+        #latest values for the local api, stale reads join the next poll batch
+        self.snapshot = None
+        if API_PORT > 0 or API_SOCKET:
+            self.snapshot = SnapshotCache(self.requestRead)
+
+        self.publisher = None
+        self.encoder = None
+        if MQTT_PUBLISH_MODE == "changes":
+            self.publisher = ChangePublisher(topic, MQTT_QOS, sensorDeadbands(), heartbeat=MQTT_HEARTBEAT)
+        else:
+            self.encoder = PayloadEncoder(MQTT_PAYLOAD_FORMAT)
+
+        self.aggregator = None
+        if AGGREGATE_WINDOW > 0:
+            keyIntervals = {normalizeKey(name): interval for name, interval in pollIntervals.items()}
+            self.aggregator = Aggregator(AGGREGATE_WINDOW, aggregateKeys(), keyIntervals)
+
+        self.diagnostics = None
+        if DIAGNOSTICS_INTERVAL > 0:
+            self.diagnostics = DiagnosticsWindow(device)
+
+        #all serial work of this pump runs on one dedicated thread, so a hanging read never blocks mqtt or other pumps
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="serial")
+
+    async def runSerial(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    #read these parameters with the next batch of the poll loop
+    #the wakeup only lets the loop pick up the new deadline, the scheduler decides when they are read
+    def requestRead(self, names: list, timeout: float) -> None:
+        self.scheduler.request(names, timeout)
+        self.wakeup.set()
+
+#Read general information, (software version, serial number)
+def readDeviceIdentity(pump: HeatPump) -> tuple:
+    version, sn = pump.session.execute(lambda hp: (hp.get_version(), str(hp.get_serial_number())))
+    return (version[0], sn)
+
+def createDevice(pump: HeatPump, identity: tuple) -> HADevice:
+    return HADevice(
+        manufacturer="Heliotherm", 
+        model="Basic Comfort",
+        name=pump.name,
+        sw_version=identity[0],
+        identifiers=[identity[1]]
+    )
 
 def modifyStats(data: dict) -> dict:
-    norm_values = {}
-    for name, val in data.items():
-        
-        #normalize key
-        new_key = re.sub(r'[^A-Za-z]', '', name).lower()
-
-
-        new_val = val
-
-        if new_key == "betriebsart":
-            match new_val:
-                case 0:
-                    new_val = "Aus"
-                case 1:
-                    new_val = "Auto"
-                case 2:
-                    new_val = "Kühlen"
-                case 3:
-                    new_val = "Sommer"
-                case 4:
-                    new_val = "Dauerbetrieb"
-                case 5:
-                    new_val = "Absenken"
-                case 6:
-                    new_val = "Urlaub"
-                case 7:
-                    new_val = "Party"
-                case _:
-                    new_val = None
-
-        #if it is boolean convert to string
-        if isinstance(new_val, bool):
-            if new_val:
-                new_val = "ON"
-            else:
-                new_val = "OFF"
-
-        #if it is a number and smaller then -50, then kill data
-        try:
-            new_val = float(new_val)
-            if new_val <= -50.:
-                new_val = None
-        except ValueError:
-            pass
-        
-        norm_values[new_key] = new_val
-
-    return norm_values
+    return applyTransforms(TRANSFORMS, data)
 
-def fixInternalClock() -> None:
-    hp = HtHeatpump(HP_DEVICE, baudrate=HP_BAUD)
+def fixInternalClock(pump: HeatPump) -> None:
     try:
-        
-        hp.open_connection()
-        hp.login()
-
-        #read current time from hp
-        dt, wd = hp.get_date_time()
-        logging.debug("time on pump: %s", dt.isoformat())
-
-        now = datetime.now().replace(microsecond=0)
-        logging.debug("time on host: %s", now.isoformat())
-
-        #check if there is a difference
-        difference = dt - now 
-        if difference.total_seconds() != 0:
-            if difference.total_seconds() < 0:
-                msg = "time on pump is %d minutes and %d seconds behind the host system"
-            else:
-                msg = "time on pump is %d minutes and %d seconds ahead of the host system"
+        drift = pump.session.execute(syncClock)
+        CLOCK_DRIFT_SECONDS.set(drift, device=pump.device)
+        if drift != 0:
+            CLOCK_CORRECTIONS.inc(device=pump.device)
+    except Exception as ex:
+        logging.exception(ex)
 
-            difference = abs(dt - now)
-            total_seconds = difference.total_seconds()
-            minutes = int(total_seconds // 60)
-            seconds = int(total_seconds % 60)
+#returns the seconds the clock of the pump was ahead of the host, it is corrected if they differ
+def syncClock(hp: HtHeatpump) -> float:
+    #read current time from hp
+    dt, wd = hp.get_date_time()
+    logging.debug("time on pump: %s", dt.isoformat())
+
+    now = datetime.now().replace(microsecond=0)
+    logging.debug("time on host: %s", now.isoformat())
+
+    #check if there is a difference
+    difference = dt - now 
+    drift = difference.total_seconds()
+    if difference.total_seconds() != 0:
+        if difference.total_seconds() < 0:
+            msg = "time on pump is %d minutes and %d seconds behind the host system"
+        else:
+            msg = "time on pump is %d minutes and %d seconds ahead of the host system"
 
-            logging.warning(msg, minutes, seconds)
+        difference = abs(dt - now)
+        total_seconds = difference.total_seconds()
+        minutes = int(total_seconds // 60)
+        seconds = int(total_seconds % 60)
 
-            #correct the time on the pump
+        logging.warning(msg, minutes, seconds)
 
-            dt, wd = hp.set_date_time() #no parameter = now
-            logging.info("setting time on pump to current time on the host system")
+        #correct the time on the pump
 
-        else:
-            logging.info("time on pump equals time on host system")
+        dt, wd = hp.set_date_time() #no parameter = now
+        logging.info("setting time on pump to current time on the host system")
 
-    except Exception as ex:
-        logging.exception(ex)
+    else:
+        logging.info("time on pump equals time on host system")
 
-    finally:
-        hp.logout()  # try to logout for an ordinary cancellation (if possible)
-        hp.close_connection()
+    return drift
 
 
-#Read contents 
-def readStats() -> dict:
+#Read contents, returns the normalized values and the names that could not be read
+#parameters that could not be read are None, so their sensors become unavailable
+def readStats(pump: HeatPump, names: list = None) -> tuple:
+    if names is None:
+        names = list(HtParams.keys())
     
-    hp = HtHeatpump(HP_DEVICE, baudrate=HP_BAUD)
     try:
-        hp.open_connection()
-        hp.login()
+        with Timer() as timer:
+            values = pump.session.execute(queryParams, names, HP_BULK, pump.device, pump.health)
+        logging.debug("read %d parameters from %s in %.2f seconds (%s query)", len(values), pump.device, timer.elapsed, "bulk" if HP_BULK else "single")
+        QUERY_SECONDS.observe(timer.elapsed, device=pump.device)
 
-        values = hp.query()
-        return modifyStats(values)
+        with Timer() as timer:
+            stats = modifyStats(values)
+        TRANSFORM_SECONDS.observe(timer.elapsed, device=pump.device)
 
     except Exception as ex:
+        READ_FAILURES.inc(device=pump.device)
         logging.exception(ex)
-
-    finally:
-        hp.logout()  # try to logout for an ordinary cancellation (if possible)
-        hp.close_connection()
+        values = {}
+        stats = {}
+    exportQuarantine(pump.health, pump.device)
+
+    failed = [name for name in names if name not in values]
+    for name in failed:
+        stats[normalizeKey(name)] = None
+
+    return stats, failed
+
+#discovery messages of a pump and their hash, built once per device identity
+def discoveryMessages(pump: HeatPump) -> tuple:
+    if pump.discovery is None or pump.discoveryDevice != pump.hadevice:
+        allSensors = []
+        #home assistant can't read binary payloads, their sensors are left out
+        if not AGGREGATE_ONLY and (pump.encoder is None or not pump.encoder.binary):
+            compactKeys = pump.encoder.keys if pump.encoder is not None and pump.encoder.format == "compact" else None
+            allSensors += createSensors(pump.topic, pump.hadevice, MQTT_QOS, perSensorTopics=pump.publisher is not None, bridgeTopic=MQTT_BRIDGE_TOPIC, compactKeys=compactKeys)
+        if pump.aggregator is not None:
+            allSensors += createAggregateSensors(pump.topic, pump.hadevice, MQTT_QOS, bridgeTopic=MQTT_BRIDGE_TOPIC)
+        if pump.diagnostics is not None:
+            allSensors += createDiagnosticSensors(pump.topic, pump.hadevice, MQTT_QOS, bridgeTopic=MQTT_BRIDGE_TOPIC)
+        if HP_FAULT_INTERVAL > 0:
+            allSensors += createFaultSensors(pump.topic, pump.hadevice, max(MQTT_QOS, 1), bridgeTopic=MQTT_BRIDGE_TOPIC)
+
+        recorder = MessageRecorder()
+        for sensor in allSensors:
+            sensor.publish(recorder)
+
+        pump.discovery = (recorder.messages, hashMessages(recorder.messages))
+        pump.discoveryDevice = pump.hadevice
+
+    return pump.discovery
 
 #push auto discovery info for home assistant
-def pushMqttConfig(mqttclient: mqtt.Client, device: HADevice) -> None:
-    logging.info("pushing online message and auto discovery info for home assistant")
-    
+#the retained config is only sent again if it differs from the last published one or force is set
+def pushMqttConfig(mqttclient: mqtt.Client, pump: HeatPump, force: bool = False) -> None:
     #Status/Alive Message
-    mqttclient.publish(MQTT_TOPIC + "/state", "online", qos=MQTT_QOS, retain=True)
+    mqttclient.publish(pump.topic + "/state", "online", qos=MQTT_QOS, retain=True)
+    #consumers of the short keys find their names here
+    if pump.encoder is not None and pump.encoder.format != "json":
+        mqttclient.publish(pump.topic + "/schema", pump.encoder.schema(), qos=MQTT_QOS, retain=True)
+
+    messages, digest = discoveryMessages(pump)
+    if not force and DISCOVERYCACHE is not None and DISCOVERYCACHE.published(pump.topic, digest):
+        logging.info("pushing online message for home assistant, auto discovery info unchanged (%s)", pump.topic)
+        return
+
+    logging.info("pushing online message and auto discovery info for home assistant (%s)", pump.topic)
 
-    allSensors = createSensors(MQTT_TOPIC, device, MQTT_QOS)
-    for sensor in allSensors:
-        sensor.publish(mqttclient)
+    sent = True
+    for topic, payload, qos, retain in messages:
+        info = mqttclient.publish(topic, payload, qos, retain)
+        sent = sent and info.rc == mqtt.MQTT_ERR_SUCCESS
+
+    if sent and DISCOVERYCACHE is not None:
+        DISCOVERYCACHE.store(pump.topic, digest)
        
-def pushMqttStats(mqttclient, mydata: dict):  
-    mqttclient.publish(MQTT_TOPIC + "/values", json.dumps(mydata), qos=MQTT_QOS)
-
-def mqttOnConnect(client, userdata, flags, reason_code, properties):
-    if reason_code == 0:
-        logging.debug('MQTT connected')
-        client.connected_flag = True
-        pushMqttConfig(client, HADEVICE)
+#returns False if the broker didn't take the values
+async def pushMqttStats(mqttclient: AsyncMqttClient, pump: HeatPump, mydata: dict) -> bool:  
+    if pump.publisher is not None:
+        return await pump.publisher.publish(mqttclient, mydata)
     else:
-        logging.info("Bad connection Returned code=", reason_code)
-    
-def mqttOnDisconnect(client, userdata, flags, reason_code, properties):
-    logging.info("MQTT disconnected")
-    client.connected_flag = False
+        return await mqttclient.publish(pump.topic + "/values", pump.encoder.encode(mydata), qos=MQTT_QOS)
+
+async def pushMqttAggregate(mqttclient: AsyncMqttClient, pump: HeatPump, aggregate: dict) -> bool:
+    return await mqttclient.publish(pump.topic + "/aggregate", json.dumps(aggregate), qos=MQTT_QOS, retain=True)
+
+def mqttOnConnect(client):
+    if MQTT_CONNECTS.get() > 0:
+        MQTT_RECONNECTS.inc()
+    MQTT_CONNECTS.inc()
+
+    if MQTT_BRIDGE_TOPIC is not None:
+        client.publish(MQTT_BRIDGE_TOPIC + "/state", "online", qos=MQTT_QOS, retain=True)
+
+    for pump in PUMPS:
+        #pumps still reading their identity announce themselves once it is known
+        if pump.hadevice is None:
+            continue
+        if pump.publisher is not None:
+            #the broker may have lost the retained values, start with a full snapshot
+            pump.publisher.reset()
+        pushMqttConfig(client, pump)
+
+#home assistant announces a restart with online on its status topic, it then needs the discovery info again
+def haStatusReceived(client, message) -> None:
+    #the retained birth message arrives on every subscribe and doesn't mean a restart
+    if message.retain or message.payload != b"online":
+        return
+
+    logging.info("home assistant came online")
+    for pump in PUMPS:
+        if pump.hadevice is not None:
+            pushMqttConfig(client, pump, force=True)
+
+#(device, baudrate, topic) of a --pump spec device:topic[:baud], parsed from the right,
+#so stable device names like /dev/serial/by-path/pci-0000:00:14.0-usb-0:2:1.0-port0 keep their colons
+def parsePumpSpec(spec: str, defaultBaudrate: int) -> tuple:
+    parts = spec.split(":")
+    baudrate = defaultBaudrate
+    if len(parts) >= 3 and parts[-1].isdigit():
+        baudrate = int(parts.pop())
+        if baudrate not in HP_BAUDRATES:
+            raise ValueError("invalid baudrate %d of pump '%s', choose from %s" % (baudrate, spec, ", ".join(str(rate) for rate in HP_BAUDRATES)))
+
+    device, topic = ":".join(parts[:-1]), parts[-1]
+    if not device or not topic:
+        raise ValueError("invalid pump '%s', expected device:topic[:baud]" % spec)
+    return (device, baudrate, topic)
 
 def parseArguments():
-    global HP_DEVICE
-    global HP_BAUD
+    global HP_PUMPS
+    global HP_KEEPALIVE
+    global HP_BULK
+    global HP_POLL_CONFIG
+    global HP_FAULT_INTERVAL
     global MQTT_CLIENT_IDENTIFIER
-    global MQTT_TOPIC
     global MQTT_BROKER_ADDRESS
     global MQTT_PORT
     global MQTT_QOS
     global MQTT_USER
     global MQTT_PASS
+    global MQTT_PUBLISH_MODE
+    global MQTT_PAYLOAD_FORMAT
+    global MQTT_HEARTBEAT
+    global MQTT_BRIDGE_TOPIC
+    global HA_STATUS_TOPIC
+    global STATE_DIR
+    global BUFFER_ENABLED
+    global BUFFER_MAX_ENTRIES
+    global BUFFER_MAX_AGE
+    global BUFFER_RATE
+    global AGGREGATE_WINDOW
+    global AGGREGATE_ONLY
+    global METRICS_HOST
+    global METRICS_PORT
+    global DIAGNOSTICS_INTERVAL
+    global API_HOST
+    global API_PORT
+    global API_SOCKET
+    global API_READ_SPACING
 
     parser = argparse.ArgumentParser(
             description="Reads stats from Heliotherm heat pump and push to MQTT", 
@@ -239,31 +372,101 @@ def parseArguments():
     group = parser.add_argument_group('General')
     group.add_argument("-h", "--help", action='help', help="show this help message and exit")
     group.add_argument("-l", "--log_level", type=str, default="info", choices=["debug","info","warning","error","critical"], help="set log level (default: %(default)s)", metavar="level")
+    group.add_argument("-s", "--state_dir", type=str, default=str(Path(__file__).parent), help="directory for files that survive a restart (default: %(default)s)", metavar="dir")
 
     group = parser.add_argument_group('Heat pump')
     group.add_argument("-d", "--device", default="/dev/ttyUSB0", type=str, help="serial device connection to heat pump (default: %(default)s)", metavar='device')
-    group.add_argument("-b", "--baudrate", default=115200, type=int, choices=[9600, 19200, 38400, 57600, 115200], help="baudrate of serial connection (as configured on the heat pump) (default: %(default)s)", metavar='baud')
+    group.add_argument("-b", "--baudrate", default=115200, type=int, choices=HP_BAUDRATES, help="baudrate of serial connection (as configured on the heat pump) (default: %(default)s)", metavar='baud')
+    group.add_argument("-P", "--pump", action="append", type=str, help="serve several heat pumps, one per serial device, each with its own topic and optional baudrate; repeat for every pump (overrides --device, --baudrate and --mqtt_topic)", metavar='device:topic[:baud]')
+    group.add_argument("-a", "--keepalive", default=30, type=int, help="seconds of inactivity after which the heat pump session is kept alive with a cheap query, 0 to disable (default: %(default)s)", metavar='seconds')
+    group.add_argument("-f", "--bulk_read", action="store_true", help="read MP data points in bulk via fast query, SP parameters one by one")
+    group.add_argument("--fault_interval", type=int, default=300, help="seconds between checks of the fault list, new entries go to <topic>/fault and the newest one to <topic>/last_fault, 0 to disable (default: %(default)s)", metavar='seconds')
+    group.add_argument("-c", "--poll_config", type=str, help="JSON file with polling intervals per group or parameter", metavar='file')
 
     group = parser.add_argument_group('MQTT')  
     group.add_argument("-i", "--mqtt_client_identifier", help="MQTT client identifier", metavar='identifier')
-    group.add_argument("-t", "--mqtt_topic",             help="Topic for stats", metavar='topic')
+    group.add_argument("-t", "--mqtt_topic",             help="Topic for stats, with several pumps topic for the availability of the bridge (default: htmqtt)", metavar='topic')
     group.add_argument("-x", "--mqtt_host",              help="Host or IP of your mqtt broker (e.g. localhost)", metavar='host/ip')
     group.add_argument("-p", "--mqtt_port",              type=int, default=1883, help="port of your mqtt broker (default: %(default)s)", metavar='port')
     group.add_argument("-u", "--mqtt_user",              help="Username for your mqtt broker", metavar='username')
     group.add_argument("-k", "--mqtt_pass",              help="Password for your mqtt broker", metavar='password')
     group.add_argument("-q", "--mqtt_qos",               type=int, choices=[0, 1], default=0, help="QoS of your messages [0/1] (default: %(default)s)", metavar='qos-level')
+    group.add_argument("-m", "--mqtt_publish_mode",      type=str, choices=["snapshot", "changes"], default="snapshot", help="publish all values as one json payload every cycle or only changed values on retained per-sensor topics (default: %(default)s)", metavar='mode')
+    group.add_argument("--payload_format",               type=str, choices=PAYLOAD_FORMATS, default="json", help="encoding of the snapshot on <topic>/values: json, json with short numeric keys and typed values (compact) or binary (cbor/msgpack, if installed), the key map of the last three is retained on <topic>/schema, home assistant reads json and compact only (default: %(default)s)", metavar='format')
+    group.add_argument("-e", "--mqtt_heartbeat",         type=int, default=900, help="seconds between full snapshots in changes mode, 0 to disable (default: %(default)s)", metavar='seconds')
+    group.add_argument("-r", "--ha_status_topic",        type=str, default="homeassistant/status", help="status topic of home assistant, auto discovery info is pushed again when it reports online, empty to disable (default: %(default)s)", metavar='topic')
+   
+    group = parser.add_argument_group('Offline buffer')
+    group.add_argument("-o", "--offline_buffer", action="store_true", help="keep readings in a file in the state directory while the broker is unreachable and replay them to <topic>/buffered on reconnect, each with the values read at its timestamp; home assistant doesn't read that topic, it is meant for recorders and loggers")
+    group.add_argument("--buffer_max_entries", type=int, default=40320, help="maximal number of buffered readings, the default holds the 168 hours of --buffer_max_age at the default poll intervals (one reading every 15 seconds) (default: %(default)s)", metavar='count')
+    group.add_argument("--buffer_max_age", type=float, default=168, help="hours after which buffered readings are dropped (default: %(default)s)", metavar='hours')
+    group.add_argument("--buffer_rate", type=float, default=10, help="replayed readings per second (default: %(default)s)", metavar='rate')
+   
+    group = parser.add_argument_group('Aggregation')
+    group.add_argument("-w", "--aggregate_window", type=int, default=0, help="publish min/max/mean/last and time-in-state of the fast and normal sensors to <topic>/aggregate every window seconds, 0 to disable (default: %(default)s)", metavar='seconds')
+    group.add_argument("--aggregate_only", action="store_true", help="publish only the aggregates, no raw values")
+
+    group = parser.add_argument_group('Metrics')
+    group.add_argument("--metrics_port", type=int, default=0, help="serve prometheus metrics on http://<metrics_host>:<port>/metrics, 0 to disable (default: %(default)s)", metavar='port')
+    group.add_argument("--metrics_host", type=str, default="127.0.0.1", help="address of the metrics endpoint (default: %(default)s)", metavar='host/ip')
+    group.add_argument("--diagnostics_interval", type=int, default=300, help="seconds between retained diagnostics on <topic>/diagnostics with home assistant entities, 0 to disable (default: %(default)s)", metavar='seconds')
+
+    group = parser.add_argument_group('Local API')
+    group.add_argument("--api_port", type=int, default=0, help="serve the latest values on http://<api_host>:<port>/values[?keys=...&max_age=seconds], older values are read with the next poll batch, 0 to disable (default: %(default)s)", metavar='port')
+    group.add_argument("--api_host", type=str, default="127.0.0.1", help="address of the local api (default: %(default)s)", metavar='host/ip')
+    group.add_argument("--api_socket", type=str, help="serve the local api on this unix socket too", metavar='path')
+    group.add_argument("--api_read_spacing", type=float, default=10., help="values older than max_age join the next poll batch, only if none comes within the timeout of the request they get a batch of their own, at least this many seconds after the last one (default: %(default)s)", metavar='seconds')
    
     args = parser.parse_args()
 
-    HP_DEVICE                   = args.device
-    HP_BAUD                     = args.baudrate
+    if args.pump:
+        HP_PUMPS = []
+        for spec in args.pump:
+            try:
+                HP_PUMPS.append(parsePumpSpec(spec, args.baudrate))
+            except ValueError as ex:
+                parser.error(str(ex))
+
+        if len(set(pump[0] for pump in HP_PUMPS)) != len(HP_PUMPS) or len(set(pump[2] for pump in HP_PUMPS)) != len(HP_PUMPS):
+            parser.error("every pump needs its own device and topic")
+    else:
+        HP_PUMPS = [(args.device, args.baudrate, args.mqtt_topic)]
+
+    HP_KEEPALIVE                = args.keepalive
+    HP_BULK                     = args.bulk_read
+    HP_POLL_CONFIG              = args.poll_config
+    HP_FAULT_INTERVAL           = args.fault_interval
     MQTT_CLIENT_IDENTIFIER      = args.mqtt_client_identifier
-    MQTT_TOPIC                  = args.mqtt_topic
     MQTT_BROKER_ADDRESS         = args.mqtt_host
     MQTT_PORT                   = args.mqtt_port
     MQTT_USER                   = args.mqtt_user
     MQTT_PASS                   = args.mqtt_pass
     MQTT_QOS                    = args.mqtt_qos
+    MQTT_PUBLISH_MODE           = args.mqtt_publish_mode
+    MQTT_PAYLOAD_FORMAT         = args.payload_format
+    MQTT_HEARTBEAT              = args.mqtt_heartbeat
+    HA_STATUS_TOPIC             = args.ha_status_topic
+    STATE_DIR                   = Path(args.state_dir)
+    BUFFER_ENABLED              = args.offline_buffer
+    BUFFER_MAX_ENTRIES          = args.buffer_max_entries
+    BUFFER_MAX_AGE              = args.buffer_max_age * 3600.
+    BUFFER_RATE                 = args.buffer_rate
+    AGGREGATE_WINDOW            = args.aggregate_window
+    AGGREGATE_ONLY              = args.aggregate_only and args.aggregate_window > 0
+    METRICS_HOST                = args.metrics_host
+    METRICS_PORT                = args.metrics_port
+    DIAGNOSTICS_INTERVAL        = args.diagnostics_interval
+    API_HOST                    = args.api_host
+    API_PORT                    = args.api_port
+    API_SOCKET                  = args.api_socket
+    API_READ_SPACING            = args.api_read_spacing
+
+    if MQTT_PAYLOAD_FORMAT != "json" and MQTT_PUBLISH_MODE != "snapshot":
+        parser.error("--payload_format only applies to the snapshot publish mode")
+
+    #with several pumps the last will can't cover every pump topic, so it goes to a common bridge topic
+    if len(HP_PUMPS) > 1:
+        MQTT_BRIDGE_TOPIC = args.mqtt_topic or "htmqtt"
 
     level_name = args.log_level.lower()
     logger = logging.getLogger()
@@ -280,63 +483,269 @@ def parseArguments():
 
     logging.debug("parsed arguments: %s", vars(args))
 
-def main():
-    global HADEVICE
-    
-    configureLogger()
-    
-    logging.info('script started')
+#read the due parameters in one batch on the serial executor of the pump and publish them
+async def pollLoop(mqttclient: AsyncMqttClient, pump: HeatPump) -> None:
+    scheduler = pump.scheduler
+
+    #latest value of every parameter, a tick only updates the due ones
+    stats = {}
+
+    while True:
+        #without offline buffer and local api there is no point in reading while the broker is away
+        if OFFLINEBUFFER is None and pump.snapshot is None:
+            await mqttclient.waitConnected()
+
+        pump.wakeup.clear()
+        names = scheduler.due()
+        if names:
+            timestamp = time.time()
+            data, failed = await pump.runSerial(readStats, pump, names)
+            scheduler.done(names)
+            scheduler.failed(failed)
+            #whatever could be read goes out, the rest is None
+            stats.update(data)
+            if pump.snapshot is not None:
+                pump.snapshot.update(data, timestamp)
+            if pump.aggregator is not None:
+                pump.aggregator.add(data, timestamp)
+
+            if not AGGREGATE_ONLY:
+                with Timer() as timer:
+                    published = mqttclient.connected and await pushMqttStats(mqttclient, pump, stats)
+                if published:
+                    PUBLISH_SECONDS.observe(timer.elapsed, device=pump.device)
+                #only what was read in this tick, the rest is already in earlier samples
+                if not published and OFFLINEBUFFER is not None:
+                    OFFLINEBUFFER.push(pump.topic, data, timestamp)
+
+        if pump.aggregator is not None and pump.aggregator.due():
+            aggregate = pump.aggregator.collect()
+            if mqttclient.connected:
+                await pushMqttAggregate(mqttclient, pump, aggregate)
+
+        #due times are monotonic deadlines, so a slow read doesn't shift the following ones
+        #a request may bring the deadline forward, the end of an aggregate window too
+        delay = scheduler.nextDue() - time.monotonic()
+        if pump.aggregator is not None:
+            delay = min(delay, pump.aggregator.deadline() - time.time())
+        try:
+            await asyncio.wait_for(pump.wakeup.wait(), max(delay, 0.))
+        except asyncio.TimeoutError:
+            pass
 
-    parseArguments()
+#every day at 0 o'clock fix clock on heat pump
+async def clockSyncLoop(pump: HeatPump) -> None:
+    lastFix = datetime.now().date()
+
+    while True:
+        now = datetime.now()
+        if now.date() != lastFix:
+            lastFix = now.date()
+            await pump.runSerial(fixInternalClock, pump)
+
+        #wake up shortly after midnight, but check at least every hour in case the host clock jumps
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+        await asyncio.sleep(min((midnight - now).total_seconds() + 1., 3600.))
+
+#replay buffered readings whenever the broker is reachable
+async def bufferReplayLoop(mqttclient: AsyncMqttClient) -> None:
+    while True:
+        await mqttclient.waitConnected()
+        if len(OFFLINEBUFFER):
+            await OFFLINEBUFFER.replay(mqttclient, MQTT_QOS, BUFFER_RATE)
+        await asyncio.sleep(5.)
+
+#check the fault list of a pump for new entries, each one is an event on <topic>/fault,
+#the newest one is retained on <topic>/last_fault
+#the synced position only moves on once the broker took everything, so no fault gets lost
+async def faultSyncLoop(mqttclient: AsyncMqttClient, pump: HeatPump) -> None:
+    #the state is only stored once the broker acknowledged the faults, with qos 0 publish() can't tell
+    qos = max(MQTT_QOS, 1)
+    while True:
+        await mqttclient.waitConnected()
+        try:
+            entries, state = await pump.runSerial(pump.session.execute, FAULTSYNC.read, pump.topic)
+        except Exception as ex:
+            logging.warning("reading the fault list of %s failed: %s", pump.device, ex)
+        else:
+            published = True
+            for entry in entries:
+                logging.warning("new fault on %s: %s (error %d at %s)", pump.device, entry["message"], entry["error"], entry["datetime"])
+                published = published and await mqttclient.publish(pump.topic + "/fault", json.dumps(entry), qos=qos)
+            if published and state["last"] is not None and (entries or FAULTSYNC.lastFault(pump.topic) != state["last"]):
+                published = await mqttclient.publish(pump.topic + "/last_fault", json.dumps(state["last"]), qos=qos, retain=True)
+            if published:
+                FAULTSYNC.store(pump.topic, state)
+
+        await asyncio.sleep(HP_FAULT_INTERVAL)
+
+#publish the diagnostics of a pump for home assistant
+async def diagnosticsLoop(mqttclient: AsyncMqttClient, pump: HeatPump) -> None:
+    while True:
+        await asyncio.sleep(DIAGNOSTICS_INTERVAL)
+        diagnostics = pump.diagnostics.collect()
+        if mqttclient.connected:
+            await mqttclient.publish(pump.topic + "/diagnostics", json.dumps(diagnostics), qos=MQTT_QOS, retain=True)
+
+#read the identity of a pump until it answers and keep it up to date
+#a new identity (e.g. after a firmware upgrade) is cached and announced to home assistant
+async def identityLoop(mqttclient: AsyncMqttClient, pump: HeatPump) -> None:
+    backoff = 0.
+    while True:
+        try:
+            identity = await pump.runSerial(readDeviceIdentity, pump)
+        except Exception as ex:
+            backoff = min(IDENTITY_RETRY_MAX, backoff * 2 if backoff else IDENTITY_RETRY_MIN)
+            logging.warning("reading the identity of the heat pump on %s failed, retrying in %.0f seconds: %s", pump.device, backoff, ex)
+            await asyncio.sleep(backoff)
+            continue
+
+        backoff = 0.
+        IDENTITYCACHE.store(pump.topic, identity)
+        hadevice = createDevice(pump, identity)
+        if hadevice != pump.hadevice:
+            if pump.hadevice is not None:
+                logging.info("identity of the heat pump on %s changed to version %s, serial number %s", pump.device, *identity)
+            pump.hadevice = hadevice
+            if mqttclient.connected:
+                pushMqttConfig(mqttclient.client, pump)
+
+        await asyncio.sleep(IDENTITY_REFRESH)
+
+#log the error of a background future nobody awaits
+def logFailure(future: asyncio.Future) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        logging.error("background job failed: %r", future.exception())
+
+#open the session of one pump and start its jobs
+#with a cached identity discovery goes out as soon as mqtt is connected, without one it waits for the heat pump,
+#a device without identifiers would show up as a second device in home assistant
+async def runPump(mqttclient: AsyncMqttClient, pump: HeatPump) -> None:
+    pump.session.start()
+
+    identity = IDENTITYCACHE.get(pump.topic)
+    if identity is not None:
+        pump.hadevice = createDevice(pump, identity)
+        if mqttclient.connected:
+            pushMqttConfig(mqttclient.client, pump)
+
+    #the serial handshake runs while mqtt connects, the serial executor keeps it ahead of the first read
+    #nobody waits for it, an error is logged by the callback
+    handshake = asyncio.ensure_future(pump.runSerial(pump.session.open))
+    handshake.add_done_callback(logFailure)
+
+    jobs = [pollLoop(mqttclient, pump), clockSyncLoop(pump), identityLoop(mqttclient, pump)]
+    if pump.diagnostics is not None:
+        jobs.append(diagnosticsLoop(mqttclient, pump))
+    if HP_FAULT_INTERVAL > 0:
+        jobs.append(faultSyncLoop(mqttclient, pump))
+    await asyncio.gather(*jobs)
+
+async def runDaemon() -> None:
+    global PUMPS
+    global TRANSFORMS
+    global OFFLINEBUFFER
+    global DISCOVERYCACHE
+    global IDENTITYCACHE
+    global FAULTSYNC
+
+    loop = asyncio.get_running_loop()
+
+    #Signal Handler for a clean shutdown
+    stopEvent = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopEvent.set)
+
+    #normalization of the read values, built once
+    TRANSFORMS = buildTransforms()
+
+    pollIntervals = loadPollIntervals(HP_POLL_CONFIG)
+
+    if len(HP_PUMPS) > 1:
+        PUMPS = [HeatPump(device, baudrate, topic, pollIntervals, name="Heliotherm Heat Pump " + topic) for device, baudrate, topic in HP_PUMPS]
+    else:
+        PUMPS = [HeatPump(device, baudrate, topic, pollIntervals) for device, baudrate, topic in HP_PUMPS]
 
-    #Signal Handler for interrupting the loop
-    signal.signal(signal.SIGINT, signalHandler)
+    PUMPS[0].scheduler.logSummary()
 
-    mqtt.Client.connected_flag = False
+    #hashes of the published discovery info, so a restart doesn't send it again
+    DISCOVERYCACHE = DiscoveryCache(STATE_DIR / "htmqtt-discovery.json")
+    #version and serial number of every pump, so discovery doesn't wait for the heat pump
+    IDENTITYCACHE = IdentityCache(STATE_DIR / "htmqtt-identity.json")
+    #position in the fault list of every pump, so only new entries are read
+    FAULTSYNC = FaultListSync(STATE_DIR / "htmqtt-faults.json")
 
     client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, MQTT_CLIENT_IDENTIFIER)
-    client.on_connect = mqttOnConnect
-    client.on_disconnect = mqttOnDisconnect
 
     if MQTT_USER != "":
         client.username_pw_set(username=MQTT_USER,password=MQTT_PASS)
 
-    client.will_set(MQTT_TOPIC + "/state","offline",MQTT_QOS,retain=True)
+    willTopic = MQTT_BRIDGE_TOPIC if MQTT_BRIDGE_TOPIC is not None else PUMPS[0].topic
+    client.will_set(willTopic + "/state","offline",MQTT_QOS,retain=True)
+
+    #one mqtt connection for all pumps
+    mqttclient = AsyncMqttClient(client, onConnect=mqttOnConnect)
+    if HA_STATUS_TOPIC:
+        mqttclient.subscribe(HA_STATUS_TOPIC, haStatusReceived)
+
+    tasks = [asyncio.create_task(mqttclient.run(MQTT_BROKER_ADDRESS, MQTT_PORT))]
+
+    if BUFFER_ENABLED:
+        OFFLINEBUFFER = OfflineBuffer(str(STATE_DIR / "htmqtt-buffer.sqlite"), maxEntries=BUFFER_MAX_ENTRIES, maxAge=BUFFER_MAX_AGE)
+        tasks.append(asyncio.create_task(bufferReplayLoop(mqttclient)))
+    if METRICS_PORT > 0:
+        tasks.append(asyncio.create_task(serveMetrics(METRICS_HOST, METRICS_PORT)))
+    snapshots = {pump.topic: pump.snapshot for pump in PUMPS if pump.snapshot is not None}
+    if API_PORT > 0:
+        tasks.append(asyncio.create_task(serveSnapshots(snapshots, host=API_HOST, port=API_PORT)))
+    if API_SOCKET:
+        tasks.append(asyncio.create_task(serveSnapshots(snapshots, socketPath=API_SOCKET)))
+    for pump in PUMPS:
+        tasks.append(asyncio.create_task(runPump(mqttclient, pump)))
+
+    #run until a quit signal arrives or a job dies
+    stopTask = asyncio.create_task(stopEvent.wait())
+    done, pending = await asyncio.wait(tasks + [stopTask], return_when=asyncio.FIRST_COMPLETED)
+    for task in done:
+        if task is not stopTask and task.exception() is not None:
+            logging.error("job failed: %r", task.exception())
+
+    if stopEvent.is_set():
+        logging.debug("Got quit signal")
+        #print to stdout for user
+        print("Got quit signal, cleaning up...")
+
+    for task in tasks + [stopTask]:
+        task.cancel()
+    await asyncio.gather(*tasks, stopTask, return_exceptions=True)
 
-    HADEVICE = readDeviceInfo()
+    #send last message
+    if mqttclient.connected:
+        logging.debug("send offline state to mqtt")
+        for pump in PUMPS:
+            await mqttclient.publish(pump.topic + "/state", "offline", qos=MQTT_QOS, retain=True)
+        if MQTT_BRIDGE_TOPIC is not None:
+            await mqttclient.publish(MQTT_BRIDGE_TOPIC + "/state", "offline", qos=MQTT_QOS, retain=True)
+        await mqttclient.disconnect()
+        logging.debug("mqtt disconnected")
+
+    #waits for a running read before logging out
+    await asyncio.gather(*(pump.runSerial(pump.session.stop) for pump in PUMPS))
+    for pump in PUMPS:
+        pump.executor.shutdown()
+    logging.debug("heat pump sessions closed")
+
+    if OFFLINEBUFFER is not None:
+        OFFLINEBUFFER.close()
 
-    try:
-        logging.debug("try to connect to mqtt %s:%d", MQTT_BROKER_ADDRESS, MQTT_PORT)
-        client.connect(MQTT_BROKER_ADDRESS, MQTT_PORT)
-        logging.info("starting the MQTT background loop")  
-        client.loop_start()
-    except:
-        #if connection was not successful, try it in next loop again
-        logging.error("connection was not successful, try it in next loop again")
-
-    while loopEnabled:
-        logging.debug("main loop")
-
-        #push to mqtt
-        if client.connected_flag: 
-            data = readStats()
-            pushMqttStats(client, data)
-
-        #every day at 0 o'clock fix clock on heat pump
-        now = datetime.now()
-        if now.hour == 0 and now.minute == 0:
-            fixInternalClock()
-        
-        #wait 60 seconds
-        time.sleep(60.0 - time.time() % 60.0)
+def main():
+    configureLogger()
+    
+    logging.info('script started')
 
-    #send last message
-    logging.debug("send offline state to mqtt")
-    client.publish(MQTT_TOPIC + "/state", "offline", qos=MQTT_QOS, retain=True)
-    client.loop_stop()
-    logging.debug("mqtt loop stopped")
-    client.disconnect()
-    logging.debug("mqtt disconnected")
+    parseArguments()
+
+    asyncio.run(runDaemon())
 
     logging.info("script finished")
 
@@ -0,0 +1,26 @@
+import asyncio
+
+#connection handler for asyncio.start_server()/start_unix_server() that answers one GET request with HTTP/1.0
+#the coroutine function respond(target) gets the request target (path and query) and returns (status, content type, body bytes)
+def httpHandler(respond):
+
+    async def handle(reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readline(), 10.)
+            while (await asyncio.wait_for(reader.readline(), 10.)) not in (b"\r\n", b"\n", b""):
+                pass
+
+            parts = request.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET":
+                status, contentType, body = await respond(parts[1])
+            else:
+                status, contentType, body = "405 Method Not Allowed", "text/plain", b"only GET is supported\n"
+
+            writer.write(("HTTP/1.0 %s\r\nContent-Type: %s\r\nContent-Length: %d\r\nConnection: close\r\n\r\n" % (status, contentType, len(body))).encode("latin-1") + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError, UnicodeDecodeError):
+            pass
+        finally:
+            writer.close()
+
+    return handle
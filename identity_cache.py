@@ -0,0 +1,23 @@
+from pathlib import Path
+from state_file import JsonStateFile
+
+#software version and serial number per node as last read from the heat pump, kept in a JSON file,
+#so discovery can go out with the right device before the heat pump answered
+class IdentityCache:
+
+    def __init__(self, path: Path) -> None:
+        self._file = JsonStateFile(path, "identity cache")
+        self._identities = self._file.load()
+
+    #(version, serial number) or None if the node was never read
+    def get(self, nodeId: str):
+        identity = self._identities.get(nodeId)
+        if not isinstance(identity, list) or len(identity) != 2:
+            return None
+        return tuple(identity)
+
+    def store(self, nodeId: str, identity: tuple) -> None:
+        if self.get(nodeId) == tuple(identity):
+            return
+        self._identities[nodeId] = list(identity)
+        self._file.save(self._identities)
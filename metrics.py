@@ -0,0 +1,202 @@
+import asyncio
+import logging
+
+from http_server import httpHandler
+
+#upper bounds in seconds of the histogram buckets, from a single serial frame up to a slow full read
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30.)
+
+#the normalization of a cycle takes microseconds
+TRANSFORM_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01)
+
+def labelKey(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+def formatLabels(key: tuple, extra: tuple = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join('%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"')) for name, value in pairs) + "}"
+
+def formatValue(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+        self._values = {}
+
+    def inc(self, amount: float = 1., **labels) -> None:
+        key = labelKey(labels)
+        self._values[key] = self._values.get(key, 0.) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(labelKey(labels), 0.)
+
+    #(labels, value) of every label set that contains the given labels
+    def series(self, **labels) -> list:
+        wanted = set(labels.items())
+        return [(dict(key), value) for key, value in list(self._values.items()) if wanted <= set(key)]
+
+    #sum over every label set that contains the given labels
+    def total(self, **labels) -> float:
+        return sum(value for key, value in self.series(**labels))
+
+    def render(self) -> list:
+        return ["%s%s %s" % (self.name, formatLabels(key), formatValue(value)) for key, value in list(self._values.items())]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        self._values[labelKey(labels)] = value
+
+#cumulative buckets, sum and count per label set like a prometheus histogram
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._values = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = labelKey(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = [[0] * len(self.buckets), 0., 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[0][i] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    #(count, sum) of one label set
+    def get(self, **labels) -> tuple:
+        entry = self._values.get(labelKey(labels))
+        if entry is None:
+            return (0, 0.)
+        return (entry[2], entry[1])
+
+    #(labels, count, sum) of every label set that contains the given labels
+    def series(self, **labels) -> list:
+        wanted = set(labels.items())
+        return [(dict(key), entry[2], entry[1]) for key, entry in list(self._values.items()) if wanted <= set(key)]
+
+    def render(self) -> list:
+        lines = []
+        #observations come from the serial threads too, iterate over a copy
+        for key, (counts, total, count) in list(self._values.items()):
+            for bound, bucketCount in zip(self.buckets, counts):
+                lines.append("%s_bucket%s %d" % (self.name, formatLabels(key, (("le", formatValue(bound)),)), bucketCount))
+            lines.append("%s_bucket%s %d" % (self.name, formatLabels(key, (("le", "+Inf"),)), count))
+            lines.append("%s_sum%s %s" % (self.name, formatLabels(key), formatValue(total)))
+            lines.append("%s_count%s %d" % (self.name, formatLabels(key), count))
+        return lines
+
+class Registry:
+
+    def __init__(self) -> None:
+        self._metrics = []
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    #prometheus text exposition format 0.0.4
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append("# HELP %s %s" % (metric.name, metric.help))
+            lines.append("# TYPE %s %s" % (metric.name, metric.kind))
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+LOGIN_SECONDS = REGISTRY.add(Histogram("htmqtt_login_seconds", "Time to open the serial port and log in to the heat pump."))
+PARAM_READ_SECONDS = REGISTRY.add(Histogram("htmqtt_param_read_seconds", "Serial round trip of a single parameter read, param=\"fast_query\" for a bulk read of MP data points."))
+QUERY_SECONDS = REGISTRY.add(Histogram("htmqtt_query_seconds", "Duration of reading all due parameters of a poll cycle."))
+TRANSFORM_SECONDS = REGISTRY.add(Histogram("htmqtt_transform_seconds", "Duration of the normalization of the read values.", TRANSFORM_BUCKETS))
+PUBLISH_SECONDS = REGISTRY.add(Histogram("htmqtt_publish_seconds", "Time until the broker took the values of a poll cycle."))
+READ_FAILURES = REGISTRY.add(Counter("htmqtt_read_failures_total", "Poll cycles whose read failed."))
+PARAM_READ_FAILURES = REGISTRY.add(Counter("htmqtt_param_read_failures_total", "Reads of a single parameter that failed after their retries, param=\"fast_query\" for a bulk read."))
+PARAMS_QUARANTINED = REGISTRY.add(Gauge("htmqtt_param_quarantined", "1 while a parameter is skipped because it kept failing, param=\"fast_query\" for the bulk read."))
+READ_RETRIES = REGISTRY.add(Counter("htmqtt_read_retries_total", "Reads that were repeated, a failed bulk read or a single parameter after a timeout."))
+MQTT_CONNECTS = REGISTRY.add(Counter("htmqtt_mqtt_connects_total", "Connections the broker accepted."))
+MQTT_RECONNECTS = REGISTRY.add(Counter("htmqtt_mqtt_reconnects_total", "Connections to the broker after the first one."))
+CLOCK_CORRECTIONS = REGISTRY.add(Counter("htmqtt_clock_corrections_total", "Times the clock of the heat pump was set to the host time."))
+CLOCK_DRIFT_SECONDS = REGISTRY.add(Gauge("htmqtt_clock_drift_seconds", "Difference between the heat pump clock and the host at the last check, positive if the heat pump is ahead."))
+
+#per device figures for the diagnostic entities, averages cover the time since the previous call
+class DiagnosticsWindow:
+
+    def __init__(self, device: str) -> None:
+        self.device = device
+        self._last = {}
+        self._loginTime = None
+
+    def _mean(self, histogram: Histogram, **labels):
+        count, total = histogram.get(device=self.device, **labels)
+        lastCount, lastTotal = self._last.get((histogram.name, labelKey(labels)), (0, 0.))
+        self._last[(histogram.name, labelKey(labels))] = (count, total)
+        if count == lastCount:
+            return None
+        return (total - lastTotal) / (count - lastCount)
+
+    def collect(self) -> dict:
+        #logins are rare, keep showing the last one
+        loginTime = self._mean(LOGIN_SECONDS)
+        if loginTime is not None:
+            self._loginTime = loginTime
+
+        diagnostics = {
+            "login_time": self._loginTime,
+            "query_time": self._mean(QUERY_SECONDS),
+            "transform_time": self._mean(TRANSFORM_SECONDS),
+            "publish_time": self._mean(PUBLISH_SECONDS),
+            #failed poll cycles and failed parameters within the others
+            "read_failures": int(READ_FAILURES.get(device=self.device) + PARAM_READ_FAILURES.total(device=self.device)),
+            "quarantined_params": int(PARAMS_QUARANTINED.total(device=self.device)),
+            "read_retries": int(READ_RETRIES.get(device=self.device)),
+            "mqtt_reconnects": int(MQTT_RECONNECTS.get()),
+            "clock_corrections": int(CLOCK_CORRECTIONS.get(device=self.device)),
+            "clock_drift": CLOCK_DRIFT_SECONDS.get(device=self.device),
+        }
+
+        #the parameter with the highest mean round trip in this window
+        slowest = None
+        slowestTime = 0.
+        for labels, count, total in PARAM_READ_SECONDS.series(device=self.device):
+            mean = self._mean(PARAM_READ_SECONDS, param=labels["param"])
+            if mean is not None and mean > slowestTime:
+                slowest, slowestTime = labels["param"], mean
+        diagnostics["slowest_param"] = slowest
+        diagnostics["slowest_param_time"] = slowestTime if slowest is not None else None
+
+        for key in ("login_time", "query_time", "slowest_param_time"):
+            if diagnostics[key] is not None:
+                diagnostics[key] = round(diagnostics[key], 3)
+        for key in ("transform_time", "publish_time"):
+            if diagnostics[key] is not None:
+                diagnostics[key] = round(diagnostics[key] * 1000., 3)
+        return diagnostics
+
+#minimal http server for GET /metrics
+async def serveMetrics(host: str, port: int) -> None:
+
+    async def respond(target: str) -> tuple:
+        if target.split("?")[0] != "/metrics":
+            return "404 Not Found", "text/plain", b"not found\n"
+        return "200 OK", "text/plain; version=0.0.4; charset=utf-8", REGISTRY.render().encode("utf-8")
+
+    server = await asyncio.start_server(httpHandler(respond), host, port)
+    logging.info("serving metrics on http://%s:%d/metrics", host, port)
+    async with server:
+        await server.serve_forever()
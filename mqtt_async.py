@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import paho.mqtt.client as mqtt
+
+#drives a paho client from the asyncio event loop instead of the loop_start() thread
+#socket reads and writes run as loop callbacks, so the connection state and every
+#publish stay on the loop thread; only the blocking connect runs in the default executor
+class AsyncMqttClient:
+
+    def __init__(self, client: mqtt.Client, onConnect=None, onDisconnect=None, backoffMin: float = 1.0, backoffMax: float = 120.0) -> None:
+        self.client = client
+        self.onConnect = onConnect
+        self.onDisconnect = onDisconnect
+        self.backoffMin = backoffMin
+        self.backoffMax = backoffMax
+
+        self._loop = None
+        self._connected = asyncio.Event()
+        self._disconnected = asyncio.Event()
+        self._miscTask = None
+        self._accepted = False
+        self._pending = {}
+        self._subscriptions = {}
+
+        client.on_connect = self._onConnect
+        client.on_disconnect = self._onDisconnect
+        client.on_publish = self._onPublish
+        client.on_socket_open = self._threadsafe(self._onSocketOpen)
+        client.on_socket_close = self._threadsafe(self._onSocketClose)
+        client.on_socket_register_write = self._threadsafe(self._onSocketRegisterWrite)
+        client.on_socket_unregister_write = self._threadsafe(self._onSocketUnregisterWrite)
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    async def waitConnected(self) -> None:
+        await self._connected.wait()
+
+    #connect and keep reconnecting with backoff until cancelled
+    async def run(self, host: str, port: int) -> None:
+        self._loop = asyncio.get_running_loop()
+        backoff = 0.
+        first = True
+        while True:
+            self._disconnected.clear()
+            try:
+                logging.debug("try to connect to mqtt %s:%d", host, port)
+                if first:
+                    await self._loop.run_in_executor(None, self.client.connect, host, port)
+                else:
+                    await self._loop.run_in_executor(None, self.client.reconnect)
+                first = False
+                self._accepted = False
+                await self._disconnected.wait()
+                #only a connection the broker accepted resets the backoff
+                if self._accepted:
+                    backoff = 0.
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                logging.error("connection to mqtt %s:%d was not successful: %s", host, port, ex)
+
+            backoff = min(self.backoffMax, backoff * 2 if backoff else self.backoffMin)
+            logging.info("reconnecting to mqtt in %.0f seconds", backoff)
+            await asyncio.sleep(backoff)
+
+    #publish without blocking the loop, for qos > 0 wait for the acknowledgement
+    #returns True if the message was handed to the broker
+    async def publish(self, topic: str, payload, qos: int = 0, retain: bool = False, timeout: float = 10.) -> bool:
+        info = self.client.publish(topic, payload, qos=qos, retain=retain)
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            return False
+        if qos == 0 or info.is_published():
+            return True
+
+        future = self._loop.create_future()
+        self._pending[info.mid] = future
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._pending.pop(info.mid, None)
+
+    #callback(client, message) for every message on topic, the subscription is renewed on each connect
+    def subscribe(self, topic: str, callback, qos: int = 0) -> None:
+        self._subscriptions[topic] = qos
+        self.client.message_callback_add(topic, lambda client, userdata, message: callback(client, message))
+        if self.connected:
+            self.client.subscribe(topic, qos)
+
+    async def disconnect(self) -> None:
+        self.client.disconnect()
+        #give the loop a moment to flush the DISCONNECT packet
+        await asyncio.sleep(0.1)
+
+    def _threadsafe(self, callback):
+        #paho calls the socket callbacks from the thread that runs connect()
+        def wrapper(*args):
+            try:
+                onLoop = asyncio.get_running_loop() is self._loop
+            except RuntimeError:
+                onLoop = False
+            if onLoop:
+                callback(*args)
+            else:
+                self._loop.call_soon_threadsafe(callback, *args)
+        return wrapper
+
+    def _onConnect(self, client, userdata, flags, reason_code, properties):
+        if reason_code == 0:
+            logging.debug('MQTT connected')
+            self._accepted = True
+            self._connected.set()
+            for topic, qos in self._subscriptions.items():
+                client.subscribe(topic, qos)
+            if self.onConnect is not None:
+                self.onConnect(client)
+        else:
+            logging.info("Bad connection Returned code=%s", reason_code)
+
+    def _onDisconnect(self, client, userdata, flags, reason_code, properties):
+        logging.info("MQTT disconnected")
+        self._connected.clear()
+        self._disconnected.set()
+        for future in self._pending.values():
+            if not future.done():
+                future.set_result(False)
+        if self.onDisconnect is not None:
+            self.onDisconnect(client)
+
+    def _onPublish(self, client, userdata, mid, reason_code, properties):
+        future = self._pending.get(mid)
+        if future is not None and not future.done():
+            future.set_result(True)
+
+    def _onSocketOpen(self, client, userdata, sock):
+        self._loop.add_reader(sock, client.loop_read)
+        self._miscTask = self._loop.create_task(self._miscLoop())
+
+    def _onSocketClose(self, client, userdata, sock):
+        self._loop.remove_reader(sock)
+        self._loop.remove_writer(sock)
+        if self._miscTask is not None:
+            self._miscTask.cancel()
+            self._miscTask = None
+        #loop_read() notices a lost connection without calling on_disconnect in every case
+        if not self._disconnected.is_set():
+            self._connected.clear()
+            self._disconnected.set()
+
+    def _onSocketRegisterWrite(self, client, userdata, sock):
+        self._loop.add_writer(sock, client.loop_write)
+
+    def _onSocketUnregisterWrite(self, client, userdata, sock):
+        self._loop.remove_writer(sock)
+
+    async def _miscLoop(self):
+        #keepalive pings and retries of unacknowledged messages
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(1)
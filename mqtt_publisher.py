@@ -0,0 +1,49 @@
+import time
+import asyncio
+import logging
+
+#publishes every value to its own retained topic <topic>/values/<key>, but only
+#if it moved beyond the deadband of its sensor since it was last published
+#all values go out on every heartbeat and after reset(), e.g. on reconnect
+#a value that is None goes out as an empty payload, which clears the retained value,
+#home assistant ignores it as a state and the availability template marks the sensor unavailable
+class ChangePublisher:
+
+    def __init__(self, topic: str, qos: int, deadbands: dict, heartbeat: float = 900.) -> None:
+        self.topic = topic
+        self.qos = qos
+        self.deadbands = deadbands
+        self.heartbeat = heartbeat
+
+        self._published = {}
+        self._lastFull = None
+
+    def reset(self) -> None:
+        self._published = {}
+        self._lastFull = None
+
+    #returns False if the broker didn't take all changed values
+    async def publish(self, mqttclient, stats: dict) -> bool:
+        now = time.monotonic()
+        full = self._lastFull is None or (self.heartbeat > 0 and now - self._lastFull >= self.heartbeat)
+        if full:
+            self._lastFull = now
+
+        changed = {}
+        for key, val in stats.items():
+            if full or key not in self._published or self._changed(key, self._published[key], val):
+                changed[key] = val
+
+        results = await asyncio.gather(*(mqttclient.publish(self.topic + "/values/" + key, "" if val is None else str(val), qos=self.qos, retain=True) for key, val in changed.items()))
+        for (key, val), ok in zip(changed.items(), results):
+            if ok:
+                self._published[key] = val
+
+        logging.debug("published %d of %d values%s", len(changed), len(stats), " (heartbeat)" if full else "")
+        return all(results)
+
+    def _changed(self, key: str, old, new) -> bool:
+        deadband = self.deadbands.get(key, 0.)
+        if deadband > 0 and isinstance(old, float) and isinstance(new, float):
+            return abs(new - old) >= deadband - 1e-9
+        return old != new
@@ -0,0 +1,87 @@
+import json
+import time
+import asyncio
+import logging
+import sqlite3
+
+from datetime import datetime
+
+#samples that could not be published, kept in a SQLite file so they survive a restart
+#the oldest samples are dropped beyond maxEntries or maxAge (seconds), by default a week of samples every 15 seconds
+#replay() sends them to <topic>/buffered for recorders, home assistant doesn't read that topic
+class OfflineBuffer:
+
+    def __init__(self, path: str, maxEntries: int = 40320, maxAge: float = 7 * 86400.) -> None:
+        self.path = path
+        self.maxEntries = maxEntries
+        self.maxAge = maxAge
+
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS samples (id INTEGER PRIMARY KEY AUTOINCREMENT, topic TEXT NOT NULL, timestamp REAL NOT NULL, payload TEXT NOT NULL)")
+        self._db.commit()
+
+        self._count = 0
+        self._expire()
+        self._count = self._db.execute("SELECT COUNT(*) FROM samples").fetchone()[0]
+        if self._count:
+            logging.info("offline buffer %s holds %d samples", path, self._count)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def push(self, topic: str, values: dict, timestamp: float = None) -> None:
+        if timestamp is None:
+            timestamp = time.time()
+
+        self._db.execute("INSERT INTO samples (topic, timestamp, payload) VALUES (?, ?, ?)", (topic, timestamp, json.dumps(values)))
+        self._count += 1
+        if self._count > self.maxEntries:
+            self._expire()
+        self._db.commit()
+
+    #oldest samples first: (id, topic, timestamp, values)
+    def peek(self, limit: int = 100) -> list:
+        rows = self._db.execute("SELECT id, topic, timestamp, payload FROM samples ORDER BY id LIMIT ?", (limit,)).fetchall()
+        return [(rowId, topic, timestamp, json.loads(payload)) for rowId, topic, timestamp, payload in rows]
+
+    def remove(self, rowId: int) -> None:
+        self._count -= self._db.execute("DELETE FROM samples WHERE id = ?", (rowId,)).rowcount
+        self._db.commit()
+
+    #publish the buffered samples in order to <topic>/buffered, at most rate samples per second
+    #stops at the first sample the broker didn't take, it stays in the buffer for the next attempt
+    async def replay(self, mqttclient, qos: int, rate: float = 10.) -> int:
+        self._expire()
+        self._db.commit()
+
+        count = 0
+        while self._count and mqttclient.connected:
+            for rowId, topic, timestamp, values in self.peek():
+                payload = {
+                    "timestamp": datetime.fromtimestamp(timestamp).astimezone().isoformat(timespec="seconds"),
+                    "values": values
+                }
+                if not await mqttclient.publish(topic + "/buffered", json.dumps(payload), qos=qos):
+                    logging.info("replay of offline buffer interrupted after %d samples", count)
+                    return count
+
+                self.remove(rowId)
+                count += 1
+                if rate > 0:
+                    await asyncio.sleep(1. / rate)
+
+        if count:
+            logging.info("replayed %d samples from offline buffer", count)
+        return count
+
+    def close(self) -> None:
+        self._db.close()
+
+    def _expire(self) -> None:
+        deleted = self._db.execute("DELETE FROM samples WHERE timestamp < ?", (time.time() - self.maxAge,)).rowcount
+        deleted += self._db.execute("DELETE FROM samples WHERE id <= (SELECT MAX(id) FROM samples) - ?", (self.maxEntries,)).rowcount
+        if deleted:
+            logging.warning("dropped %d expired or excess samples from offline buffer", deleted)
+            self._count = self._db.execute("SELECT COUNT(*) FROM samples").fetchone()[0]
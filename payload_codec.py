@@ -0,0 +1,90 @@
+import io
+import json
+
+from htheatpump.htparams import HtDataTypes, HtParams
+from ha_sensors import normalizeKey
+
+#binary encodings are optional, the format is only offered if its package is installed
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+#json: the named payload home assistant reads, compact: json with short numeric keys,
+#cbor/msgpack: binary with integer keys, for consumers that don't need home assistant
+PAYLOAD_FORMATS = ["json", "compact"] + (["cbor"] if cbor2 is not None else []) + (["msgpack"] if msgpack is not None else [])
+
+#short key of every parameter: its position in HtParams, published with the schema
+def compactKeys() -> dict:
+    return {normalizeKey(name): i for i, name in enumerate(HtParams.keys())}
+
+#serializes the values payload of a poll cycle, the encoder objects and their buffers live as long as the publisher
+#all formats but json carry typed values: booleans instead of "ON"/"OFF" and integers for integer parameters
+class PayloadEncoder:
+
+    def __init__(self, payloadFormat: str = "json") -> None:
+        if payloadFormat not in PAYLOAD_FORMATS:
+            raise ValueError("payload format %s is not available" % payloadFormat)
+        self.format = payloadFormat
+
+        self.keys = compactKeys()
+        types = {normalizeKey(name): param.data_type for name, param in HtParams.items()}
+        #one dict for the typed values, refilled every cycle
+        self._typed = {}
+
+        if payloadFormat == "json":
+            self._encoder = json.JSONEncoder()
+        elif payloadFormat == "compact":
+            self._encoder = json.JSONEncoder(separators=(",", ":"))
+            self.keys = {key: str(short) for key, short in self.keys.items()}
+        elif payloadFormat == "cbor":
+            self._buffer = io.BytesIO()
+            self._encoder = cbor2.CBOREncoder(self._buffer, canonical=True)
+        else:
+            self._encoder = msgpack.Packer()
+
+        #short key and type of every key, looked up once per value
+        self._fields = {key: (short, types.get(key)) for key, short in self.keys.items()}
+
+    @property
+    def binary(self) -> bool:
+        return self.format in ("cbor", "msgpack")
+
+    def encode(self, stats: dict):
+        if self.format == "json":
+            return self._encoder.encode(stats)
+
+        typed = self._typed
+        typed.clear()
+        fields = self._fields
+        for key, val in stats.items():
+            short, dataType = fields.get(key, (key, None))
+            if dataType == HtDataTypes.BOOL:
+                if val == "ON":
+                    val = True
+                elif val == "OFF":
+                    val = False
+            elif dataType == HtDataTypes.INT and isinstance(val, float) and val.is_integer():
+                val = int(val)
+            typed[short] = val
+
+        if self.format == "compact":
+            return self._encoder.encode(typed)
+        if self.format == "cbor":
+            self._buffer.seek(0)
+            self._buffer.truncate()
+            self._encoder.encode(typed)
+            return self._buffer.getvalue()
+        return self._encoder.pack(typed)
+
+    #retained description of the payload, maps the short keys back to the named ones
+    def schema(self) -> str:
+        return json.dumps({
+            "format": self.format,
+            "keys": {str(short): key for key, short in self.keys.items()},
+        })
@@ -0,0 +1,134 @@
+import json
+import math
+import time
+import logging
+
+from htheatpump.htparams import HtParams
+from ha_sensors import POLL_GROUPS, POLL_GROUP_DEFAULT, pollGroups
+
+#build the polling interval (seconds) of every known heat pump parameter
+#defaults come from the sensor table, the optional JSON config file may override
+#whole groups and single parameters, e.g.
+#   {"groups": {"fast": 10}, "parameters": {"Temp. Aussen": 300, "Liegenschaft": 0}}
+#an interval of 0 disables polling of a parameter
+def loadPollIntervals(configFile: str = None) -> dict:
+    groupIntervals = dict(POLL_GROUPS)
+    paramIntervals = {}
+
+    if configFile:
+        with open(configFile, encoding="utf-8") as f:
+            config = json.load(f)
+
+        for group, interval in config.get("groups", {}).items():
+            if group not in groupIntervals:
+                raise ValueError("unknown poll group '%s' in %s" % (group, configFile))
+            groupIntervals[group] = float(interval)
+
+        for name, interval in config.get("parameters", {}).items():
+            if name not in HtParams:
+                raise ValueError("unknown heat pump parameter '%s' in %s" % (name, configFile))
+            paramIntervals[name] = float(interval)
+
+    groups = pollGroups()
+    intervals = {}
+    for name in HtParams.keys():
+        interval = paramIntervals.get(name, groupIntervals[groups.get(name, POLL_GROUP_DEFAULT)])
+        if interval > 0:
+            intervals[name] = interval
+
+    return intervals
+
+#keeps track of the next due time of every parameter on the monotonic clock
+#due times advance by whole intervals, so late ticks don't add up to drift
+#requested parameters join the next regular batch once, without moving their regular due time;
+#only if no regular batch comes within the timeout of a request (or nothing is polled at all),
+#they get a batch of their own, at least requestSpacing seconds after the last batch
+class PollScheduler:
+
+    def __init__(self, intervals: dict, retryDelay: float = 60., requestSpacing: float = 10.) -> None:
+        self.intervals = dict(intervals)
+        self.retryDelay = retryDelay
+        self.requestSpacing = requestSpacing
+
+        now = time.monotonic()
+        self._nextDue = {name: now for name in self.intervals}
+        #requested parameters: (batch number at their arrival, monotonic deadline of the reader)
+        self._requested = {}
+        self._batch = 0
+        self._lastBatch = now - requestSpacing
+
+    #read these parameters with the next batch, also ones that are not polled at all,
+    #the reader waits at most timeout seconds for them
+    def request(self, names: list, timeout: float = 30., now: float = None) -> None:
+        if now is None:
+            now = time.monotonic()
+        deadline = now + timeout
+        #a repeated request while its batch is read counts from now on
+        for name in names:
+            previous = self._requested.get(name)
+            self._requested[name] = (self._batch, deadline if previous is None else min(previous[1], deadline))
+
+    #time of a batch of its own for the requested parameters, None if a regular one comes soon enough
+    def _requestDue(self):
+        deadline = min(requested[1] for requested in self._requested.values())
+        regular = min(self._nextDue.values(), default=None)
+        if regular is not None and regular <= deadline:
+            return None
+        return self._lastBatch + self.requestSpacing
+
+    #parameters which are due at the given time and the requested ones, in table order
+    def due(self, now: float = None) -> list:
+        if now is None:
+            now = time.monotonic()
+        names = [name for name, nextDue in self._nextDue.items() if nextDue <= now]
+        requestDue = self._requestDue() if self._requested else None
+        if self._requested and (names or (requestDue is not None and now >= requestDue)):
+            names = [name for name in HtParams.keys() if name in self._requested or self._nextDue.get(name, now + 1.) <= now]
+        if names:
+            self._lastBatch = now
+            #a request that arrives while this batch is read stays open for the next one
+            self._batch += 1
+        return names
+
+    def done(self, names: list, now: float = None) -> None:
+        if now is None:
+            now = time.monotonic()
+
+        for name in names:
+            if self._requested.get(name, (self._batch,))[0] < self._batch:
+                del self._requested[name]
+            interval = self.intervals.get(name)
+            #only requested, its regular read is still ahead
+            if interval is None or self._nextDue[name] > now:
+                continue
+            nextDue = self._nextDue[name] + interval
+            if nextDue <= now:
+                #we missed one or more slots, skip them instead of catching up
+                nextDue += math.ceil((now - nextDue) / interval) * interval
+                if nextDue <= now:
+                    nextDue += interval
+            self._nextDue[name] = nextDue
+
+    #parameters of the last batch that could not be read come again after retryDelay instead of a whole interval
+    def failed(self, names: list, now: float = None) -> None:
+        if now is None:
+            now = time.monotonic()
+
+        for name in names:
+            if name in self._nextDue:
+                self._nextDue[name] = min(self._nextDue[name], now + self.retryDelay)
+
+    def nextDue(self) -> float:
+        nextDue = min(self._nextDue.values(), default=time.monotonic() + 60.)
+        if self._requested:
+            requestDue = self._requestDue()
+            if requestDue is not None:
+                return min(nextDue, requestDue)
+        return nextDue
+
+    def logSummary(self) -> None:
+        perInterval = {}
+        for interval in self.intervals.values():
+            perInterval[interval] = perInterval.get(interval, 0) + 1
+        for interval, count in sorted(perInterval.items()):
+            logging.info("polling %d parameters every %g seconds", count, interval)
@@ -0,0 +1,117 @@
+import json
+import time
+import asyncio
+import logging
+
+from urllib.parse import parse_qs, urlsplit
+from htheatpump.htparams import HtParams
+from ha_sensors import normalizeKey
+from http_server import httpHandler
+
+#latest normalized value of every parameter with the time it was read, for local consumers
+#a read with maxAge asks requestRead(names, timeout) to read the older values with the next poll batch
+#and waits until update() brings them, the cache itself never talks to the heat pump
+#a failed read (None) keeps the previous value and its timestamp, failed() tells that the last attempt failed
+class SnapshotCache:
+
+    def __init__(self, requestRead=None) -> None:
+        self.requestRead = requestRead
+        self.names = {normalizeKey(name): name for name in HtParams.keys()}
+
+        self._values = {}
+        self._failures = {}
+        self._waiters = []
+
+    #values of one poll batch, read at timestamp (seconds since the epoch)
+    def update(self, stats: dict, timestamp: float) -> None:
+        for key, val in stats.items():
+            if val is None:
+                self._failures[key] = timestamp
+            else:
+                self._values[key] = (val, timestamp)
+                self._failures.pop(key, None)
+
+        #a waiter is done once every key was read again, successfully or not
+        for waiter in list(self._waiters):
+            keys, since, future = waiter
+            if all(max(self._values.get(key, (None, 0.))[1], self._failures.get(key, 0.)) >= since for key in keys):
+                self._waiters.remove(waiter)
+                if not future.done():
+                    future.set_result(True)
+
+    #True if the last read of key failed, its value is older than that
+    def failed(self, key: str) -> bool:
+        return key in self._failures
+
+    #{key: (value, timestamp)} of the given keys, None for keys never read
+    #keys older than maxAge seconds are read first, at most timeout seconds are spent waiting for them
+    async def read(self, keys: list, maxAge: float = None, timeout: float = 30.) -> dict:
+        now = time.time()
+        if maxAge is not None and self.requestRead is not None:
+            stale = [key for key in keys if key not in self._values or now - self._values[key][1] > maxAge]
+            if stale:
+                waiter = (stale, now, asyncio.get_running_loop().create_future())
+                self._waiters.append(waiter)
+                self.requestRead([self.names[key] for key in stale], timeout)
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter[2]), timeout)
+                except asyncio.TimeoutError:
+                    logging.info("snapshot read of %d stale values timed out", len(stale))
+                finally:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+
+        return {key: self._values.get(key) for key in keys}
+
+#minimal http server for GET /values[?pump=topic&keys=key,...&max_age=seconds&timeout=seconds] on a tcp port or a unix socket
+#answers {"pump": topic, "values": {key: {"value": ..., "timestamp": ..., "age": ..., "failed": ...}}}, keys as in the values payload,
+#failed is true if the last read of the key failed and the value is from an earlier one
+async def serveSnapshots(caches: dict, host: str = None, port: int = 0, socketPath: str = None) -> None:
+
+    def seconds(text: str) -> float:
+        return float(text[:-1] if text.endswith("s") else text)
+
+    async def answer(target: str) -> tuple:
+        url = urlsplit(target)
+        if url.path != "/values":
+            return "404 Not Found", {"error": "not found"}
+
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        topic = query.get("pump", next(iter(caches)))
+        cache = caches.get(topic)
+        if cache is None:
+            return "404 Not Found", {"error": "unknown pump %s" % topic}
+
+        keys = [key for key in query["keys"].split(",") if key] if "keys" in query else list(cache.names)
+        unknown = [key for key in keys if key not in cache.names]
+        if unknown:
+            return "400 Bad Request", {"error": "unknown keys %s" % ", ".join(unknown)}
+
+        try:
+            maxAge = seconds(query["max_age"]) if "max_age" in query else None
+            timeout = seconds(query.get("timeout", "30"))
+        except ValueError:
+            return "400 Bad Request", {"error": "max_age and timeout are seconds"}
+
+        entries = await cache.read(keys, maxAge, timeout)
+        now = time.time()
+        values = {}
+        for key, entry in entries.items():
+            if entry is None:
+                values[key] = {"value": None, "timestamp": None, "age": None, "failed": cache.failed(key)}
+            else:
+                values[key] = {"value": entry[0], "timestamp": round(entry[1], 3), "age": round(now - entry[1], 3), "failed": cache.failed(key)}
+        return "200 OK", {"pump": topic, "values": values}
+
+    async def respond(target: str) -> tuple:
+        status, payload = await answer(target)
+        return status, "application/json", json.dumps(payload).encode("utf-8")
+
+    if socketPath:
+        server = await asyncio.start_unix_server(httpHandler(respond), socketPath)
+        logging.info("serving snapshots on unix socket %s", socketPath)
+    else:
+        server = await asyncio.start_server(httpHandler(respond), host, port)
+        logging.info("serving snapshots on http://%s:%d/values", host, port)
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,34 @@
+import json
+import logging
+
+from pathlib import Path
+
+#a dict kept in a JSON file in the state directory
+#an unreadable file is logged and starts empty, saving writes a temporary file and replaces the old one,
+#so a crash never leaves a half written file behind
+class JsonStateFile:
+
+    def __init__(self, path: Path, description: str) -> None:
+        self.path = path
+        self.description = description
+
+    def load(self) -> dict:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as ex:
+            logging.warning("ignoring unreadable %s %s: %s", self.description, self.path, ex)
+            return {}
+
+        if not isinstance(data, dict):
+            logging.warning("ignoring unreadable %s %s: not a JSON object", self.description, self.path)
+            return {}
+        return data
+
+    def save(self, data: dict) -> None:
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        tmp.replace(self.path)
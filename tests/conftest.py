@@ -0,0 +1,6 @@
+import sys
+
+from pathlib import Path
+
+#the modules live in the repository root next to htmqtt.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,45 @@
+from aggregation import Aggregator, RingBuffer, StateTimer
+from ha_sensors import createAggregateSensors
+from mqtt_homeassistant_utils import HADevice
+
+def test_ring_buffer_keeps_the_latest_samples():
+    buffer = RingBuffer(3)
+    for i in range(5):
+        buffer.append(float(i), 100. + i)
+    assert len(buffer) == 3
+    assert buffer.stats(0.) == {"min": 2., "max": 4., "mean": 3., "last": 4.}
+    assert buffer.stats(104.) == {"min": 4., "max": 4., "mean": 4., "last": 4.}
+    assert buffer.stats(105.) is None
+
+def test_state_timer_carries_the_running_state_over():
+    timer = StateTimer()
+    timer.update("ON", 0.)
+    timer.update("OFF", 30.)
+    assert timer.collect(100.) == {"ON": 30., "OFF": 70.}
+    assert timer.collect(110.) == {"OFF": 10.}
+
+def test_window_deadline_and_collect():
+    aggregator = Aggregator(300., {"tempaussen": "numeric", "verdichter": "state"}, {"tempaussen": 60.})
+    start = aggregator.deadline() - 300.
+    aggregator.add({"tempaussen": 5., "verdichter": "OFF"}, start + 1.)
+    aggregator.add({"tempaussen": None, "verdichter": "ON"}, start + 61.)
+    aggregator.add({"tempaussen": 7.}, start + 121.)
+
+    assert not aggregator.due(start + 299.)
+    assert aggregator.due(start + 300.)
+    result = aggregator.collect(start + 301.)
+    assert result["tempaussen"] == {"min": 5., "max": 7., "mean": 6., "last": 7.}
+    assert result["verdichter"] == {"OFF": 60., "ON": 240.}
+    assert aggregator.deadline() == start + 601.
+
+def test_aggregate_sensors_without_samples_are_unavailable():
+    sensors = createAggregateSensors("hp", HADevice(name="hp"), 0)
+    minimum = next(sensor for sensor in sensors if sensor.name == "Temp. Aussen min")
+    assert "None" not in minimum.value_template
+    assert minimum.availability_mode == "all"
+    assert any("value_json.tempaussen is defined" in (avail.value_template or "") for avail in minimum.availability)
+
+def test_every_window_statistic_has_an_entity():
+    names = [sensor.name for sensor in createAggregateSensors("hp", HADevice(name="hp"), 0)]
+    for stat in ("min", "max", "mean", "last"):
+        assert "Temp. Aussen " + stat in names
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta, timezone
+
+from fault_sync import FaultListSync
+
+START = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+#the heat pump numbers the entries by their position, a rotation moves the index of every entry
+class FakeHeatPump:
+
+    def __init__(self, count: int) -> None:
+        self.faults = []
+        self.added = 0
+        self.frames = 0
+        for _ in range(count):
+            self.add()
+
+    def add(self) -> None:
+        i = self.added
+        self.added += 1
+        self.faults.append({"error": 20 + i, "datetime": START + timedelta(days=i), "message": "Fehler %d" % i})
+
+    #a full list drops its oldest entry for every new one
+    def rotate(self, count: int = 1) -> None:
+        for _ in range(count):
+            self.add()
+            del self.faults[0]
+
+    def get_fault_list_size(self):
+        self.frames += 1
+        return len(self.faults)
+
+    def get_fault_list(self, *indices):
+        self.frames += 1
+        if not indices:
+            indices = range(len(self.faults))
+        return [dict(self.faults[i], index=i) for i in indices]
+
+def sync(faultSync, hp):
+    entries, state = faultSync.read(hp, "hp")
+    faultSync.store("hp", state)
+    return [entry["message"] for entry in entries]
+
+def test_first_sync_only_takes_the_newest_entry(tmp_path):
+    faultSync = FaultListSync(tmp_path / "faults.json")
+    hp = FakeHeatPump(3)
+    assert sync(faultSync, hp) == []
+    assert faultSync.lastFault("hp")["message"] == "Fehler 2"
+
+def test_new_entries_are_read_incrementally(tmp_path):
+    faultSync = FaultListSync(tmp_path / "faults.json")
+    hp = FakeHeatPump(3)
+    sync(faultSync, hp)
+
+    hp.frames = 0
+    assert sync(faultSync, hp) == []
+    assert hp.frames == 2
+
+    hp.add()
+    hp.add()
+    hp.frames = 0
+    assert sync(faultSync, hp) == ["Fehler 3", "Fehler 4"]
+    assert hp.frames == 2
+    #the state survives a restart
+    assert FaultListSync(tmp_path / "faults.json").lastFault("hp")["message"] == "Fehler 4"
+
+def test_a_rotated_list_of_the_same_size_is_detected(tmp_path):
+    faultSync = FaultListSync(tmp_path / "faults.json")
+    hp = FakeHeatPump(100)
+    sync(faultSync, hp)
+
+    hp.rotate()
+    hp.frames = 0
+    assert sync(faultSync, hp) == ["Fehler 100"]
+    #ALS, the expected position of the known entry and one chunk before it instead of all 100 entries
+    assert hp.frames == 3
+
+    hp.rotate(15)
+    hp.frames = 0
+    assert sync(faultSync, hp) == ["Fehler %d" % i for i in range(101, 116)]
+    assert hp.frames == 4
+
+def test_a_rewritten_list_is_read_completely(tmp_path):
+    faultSync = FaultListSync(tmp_path / "faults.json")
+    hp = FakeHeatPump(30)
+    sync(faultSync, hp)
+
+    #the known entry is gone, everything newer than it is new
+    hp.rotate(40)
+    hp.frames = 0
+    assert sync(faultSync, hp) == ["Fehler %d" % i for i in range(40, 70)]
+    assert hp.frames == 5
+
+def test_a_cleared_list_starts_over(tmp_path):
+    faultSync = FaultListSync(tmp_path / "faults.json")
+    hp = FakeHeatPump(3)
+    sync(faultSync, hp)
+
+    hp.faults.clear()
+    assert sync(faultSync, hp) == []
+    assert faultSync.lastFault("hp") is None
+
+    hp.add()
+    assert sync(faultSync, hp) == ["Fehler 3"]
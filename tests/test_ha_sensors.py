@@ -0,0 +1,12 @@
+from ha_sensors import createDiagnosticSensors, createFaultSensors, createSensors
+from mqtt_homeassistant_utils import HADevice
+
+def test_every_entity_depends_on_the_pump_and_the_bridge():
+    device = HADevice(name="hp")
+    for create in (createSensors, createDiagnosticSensors, createFaultSensors):
+        sensor = create("hp", device, 0, bridgeTopic="bridge")[0]
+        assert [avail.topic for avail in sensor.availability][:2] == ["hp/state", "bridge/state"]
+        assert sensor.availability_mode == "all"
+
+        sensor = create("hp", device, 0)[0]
+        assert sensor.availability[0].topic == "hp/state"
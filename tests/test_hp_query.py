@@ -0,0 +1,117 @@
+import pytest
+
+from htheatpump.htparams import HtParams
+from hp_query import ParamHealth, exportQuarantine, queryParams, singleQuery
+from metrics import PARAM_READ_FAILURES, PARAMS_QUARANTINED, DiagnosticsWindow
+
+class FakeHeatPump:
+
+    def __init__(self, broken=(), bulkFails=False, reconnectFails=False) -> None:
+        self.broken = set(broken)
+        self.bulkFails = bulkFails
+        self.reconnectFails = reconnectFails
+        self.bulkReads = []
+        self.singleReads = []
+        self.reconnects = 0
+
+    def get_param(self, name):
+        self.singleReads.append(name)
+        if name in self.broken:
+            raise IOError("no answer for %s" % name)
+        return 1
+
+    def fast_query(self, *names):
+        self.bulkReads.append(names)
+        if self.bulkFails or self.broken & set(names):
+            raise IOError("broken MR frame")
+        return {name: 1 for name in names}
+
+    def reconnect(self):
+        self.reconnects += 1
+        if self.reconnectFails:
+            raise IOError("port gone")
+
+    def login(self):
+        pass
+
+MP = [name for name in HtParams.keys() if HtParams[name].dp_type == "MP"][:4]
+
+def test_timeout_follows_the_latency_within_bounds():
+    health = ParamHealth(minTimeout=0.5, maxTimeout=5., timeoutFactor=4.)
+    assert health.timeout("a") == 5.
+    health.success("a", 0.2)
+    assert health.timeout("a") == pytest.approx(0.8)
+    #a parameter that never answered gets the typical round trip
+    assert health.timeout("b") == pytest.approx(0.8)
+    health.success("c", 0.01)
+    assert health.timeout("c") == 0.5
+
+def test_quarantine_backs_off_exponentially():
+    health = ParamHealth(quarantineAfter=2, backoffMin=60., backoffMax=100.)
+    health.failure("a", 0.)
+    assert health.available("a", 0.)
+    health.failure("a", 0.)
+    assert not health.available("a", 59.)
+    assert health.quarantined(59.) == ["a"]
+    assert health.available("a", 60.)
+    health.failure("a", 60.)
+    assert not health.available("a", 159.)
+    health.success("a", 0.1)
+    assert health.available("a", 0.)
+
+def test_single_reads_are_isolated():
+    health = ParamHealth(maxRetries=1)
+    hp = FakeHeatPump(broken=["Temp. Aussen"])
+    values = singleQuery(hp, ["Temp. Aussen", "Temp. Vorlauf"], health=health)
+    assert values == {"Temp. Vorlauf": 1}
+    assert hp.singleReads.count("Temp. Aussen") == 2
+
+    with pytest.raises(IOError):
+        singleQuery(hp, ["Temp. Aussen"], health=health)
+
+def test_failed_bulk_reads_are_charged_and_skipped():
+    health = ParamHealth(quarantineAfter=2)
+    hp = FakeHeatPump(broken=[MP[0]])
+
+    for _ in range(2):
+        values = queryParams(hp, MP, bulk=True, health=health)
+        assert list(values) == MP[1:]
+    assert len(hp.bulkReads) == 2
+    assert not health.available("fast_query")
+
+    #the bulk request is skipped, the broken data point was quarantined by the single reads meanwhile
+    hp.bulkReads.clear()
+    hp.singleReads.clear()
+    assert list(queryParams(hp, MP, bulk=True, health=health)) == MP[1:]
+    assert hp.bulkReads == []
+    assert MP[0] not in hp.singleReads
+
+def test_quarantined_parameters_are_not_in_the_bulk_request():
+    health = ParamHealth(quarantineAfter=1)
+    health.failure(MP[0])
+    hp = FakeHeatPump()
+    assert list(queryParams(hp, MP, bulk=True, health=health)) == MP[1:]
+    assert hp.bulkReads == [tuple(MP[1:])]
+
+def test_a_failing_reconnect_does_not_lose_the_cycle():
+    hp = FakeHeatPump(bulkFails=True, reconnectFails=True)
+    assert list(queryParams(hp, MP, bulk=True, health=ParamHealth())) == MP
+    assert hp.reconnects == 1
+
+def test_failed_parameters_are_counted_and_quarantine_is_exported():
+    health = ParamHealth(maxRetries=0, quarantineAfter=2)
+    hp = FakeHeatPump(broken=["Temp. Aussen"])
+    for _ in range(3):
+        singleQuery(hp, ["Temp. Aussen", "Temp. Vorlauf"], device="broken", health=health)
+        exportQuarantine(health, "broken")
+    assert PARAM_READ_FAILURES.get(device="broken", param="Temp. Aussen") == 3
+    assert PARAMS_QUARANTINED.get(device="broken", param="Temp. Aussen") == 1.
+
+    diagnostics = DiagnosticsWindow("broken").collect()
+    assert diagnostics["read_failures"] == 3
+    assert diagnostics["quarantined_params"] == 1
+
+    hp.broken.clear()
+    singleQuery(hp, ["Temp. Aussen"], device="broken", health=health)
+    exportQuarantine(health, "broken")
+    assert PARAMS_QUARANTINED.get(device="broken", param="Temp. Aussen") == 0.
@@ -0,0 +1,87 @@
+import time
+import pytest
+
+import hp_session
+from hp_session import HpSession
+
+class FakeHeatPump:
+
+    def __init__(self, device, baudrate=115200) -> None:
+        self.calls = []
+        self.loginFails = False
+
+    def open_connection(self):
+        self.calls.append("open")
+
+    def login(self):
+        self.calls.append("login")
+        if self.loginFails:
+            raise IOError("no answer")
+
+    def logout(self):
+        self.calls.append("logout")
+
+    def close_connection(self):
+        self.calls.append("close")
+
+    def get_serial_number(self):
+        self.calls.append("serial")
+        return 123456
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setattr(hp_session, "HtHeatpump", FakeHeatPump)
+    session = HpSession("/dev/null", 115200, keepaliveInterval=0, backoffMin=2., backoffMax=8.)
+    yield session
+    session.stop()
+
+def failing(hp):
+    raise IOError("broken frame")
+
+def test_a_failed_request_opens_the_backoff(session):
+    assert session.execute(FakeHeatPump.get_serial_number) == 123456
+    with pytest.raises(IOError, match="broken frame"):
+        session.execute(failing)
+    assert session._hp.calls[-2:] == ["logout", "close"]
+
+    #no connection attempt until the backoff is over
+    session._hp.calls.clear()
+    with pytest.raises(IOError, match="unavailable"):
+        session.execute(FakeHeatPump.get_serial_number)
+    assert session._hp.calls == []
+    assert session._nextAttempt - time.monotonic() == pytest.approx(2., abs=0.5)
+
+def test_the_backoff_doubles_and_a_login_resets_it(session):
+    session._hp.loginFails = True
+    for backoff in (2., 4., 8., 8.):
+        session._nextAttempt = 0.
+        with pytest.raises(IOError, match="no answer"):
+            session.execute(FakeHeatPump.get_serial_number)
+        assert session._backoff == backoff
+
+    session._hp.loginFails = False
+    session._nextAttempt = 0.
+    assert session.open()
+    assert session._backoff == 0.
+    assert session._nextAttempt == 0.
+
+def test_the_keepalive_waits_for_a_running_caller(monkeypatch):
+    monkeypatch.setattr(hp_session, "HtHeatpump", FakeHeatPump)
+    session = HpSession("/dev/null", 115200, keepaliveInterval=0.1)
+    try:
+        assert session.open()
+        session.start()
+        with session._lock:
+            session._lastActivity = 0.
+            time.sleep(0.3)
+            assert "serial" not in session._hp.calls
+        time.sleep(0.3)
+        assert "serial" in session._hp.calls
+    finally:
+        session.stop()
+
+def test_stop_logs_out_and_closes_the_port(session):
+    assert session.open()
+    session.stop()
+    assert session._hp.calls[-2:] == ["logout", "close"]
+    assert not session._loggedIn
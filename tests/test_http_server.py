@@ -0,0 +1,32 @@
+import asyncio
+
+from http_server import httpHandler
+
+async def request(port, line):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(line + b"\r\nHost: localhost\r\n\r\n")
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response
+
+def test_get_requests_go_to_the_callback():
+    async def scenario():
+        targets = []
+
+        async def respond(target):
+            targets.append(target)
+            return "200 OK", "text/plain", b"hello"
+
+        server = await asyncio.start_server(httpHandler(respond), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            ok = await request(port, b"GET /values?keys=a HTTP/1.1")
+            refused = await request(port, b"POST /values HTTP/1.1")
+
+        assert targets == ["/values?keys=a"]
+        assert ok.startswith(b"HTTP/1.0 200 OK\r\n")
+        assert b"Content-Length: 5\r\n" in ok and ok.endswith(b"\r\n\r\nhello")
+        assert refused.startswith(b"HTTP/1.0 405 ")
+
+    asyncio.run(scenario())
@@ -0,0 +1,34 @@
+from metrics import Counter, Gauge, Histogram, Registry
+
+def test_counter_and_gauge_per_label_set():
+    counter = Counter("reads_total", "Reads.")
+    counter.inc(device="a")
+    counter.inc(2., device="a")
+    counter.inc(device="b")
+    assert counter.get(device="a") == 3.
+    assert counter.get(device="c") == 0.
+
+    gauge = Gauge("drift_seconds", "Drift.")
+    gauge.set(1.5)
+    gauge.set(-0.5)
+    assert gauge.get() == -0.5
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("read_seconds", "Reads.", buckets=(0.1, 1.))
+    for value in (0.05, 0.5, 5.):
+        histogram.observe(value, param="x")
+    assert histogram.get(param="x") == (3, 5.55)
+    assert histogram.series() == [({"param": "x"}, 3, 5.55)]
+    assert histogram.render() == [
+        'read_seconds_bucket{param="x",le="0.1"} 1',
+        'read_seconds_bucket{param="x",le="1.0"} 2',
+        'read_seconds_bucket{param="x",le="+Inf"} 3',
+        'read_seconds_sum{param="x"} 5.55',
+        'read_seconds_count{param="x"} 3',
+    ]
+
+def test_registry_renders_the_text_format():
+    registry = Registry()
+    counter = registry.add(Counter("reads_total", "Reads."))
+    counter.inc(device='say "hi"')
+    assert registry.render() == '# HELP reads_total Reads.\n# TYPE reads_total counter\nreads_total{device="say \\"hi\\""} 1.0\n'
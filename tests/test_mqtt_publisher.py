@@ -0,0 +1,46 @@
+import asyncio
+
+from mqtt_publisher import ChangePublisher
+
+class FakeClient:
+
+    def __init__(self) -> None:
+        self.messages = []
+
+    async def publish(self, topic, payload, qos=0, retain=False):
+        self.messages.append((topic, payload, retain))
+        return True
+
+def publish(publisher, client, stats):
+    return asyncio.run(publisher.publish(client, stats))
+
+def test_only_changes_beyond_the_deadband_are_published():
+    publisher = ChangePublisher("hp", 0, {"tempaussen": 0.2}, heartbeat=0)
+    client = FakeClient()
+
+    assert publish(publisher, client, {"tempaussen": 5.0, "verdichter": "ON"})
+    assert len(client.messages) == 2
+
+    client.messages.clear()
+    publish(publisher, client, {"tempaussen": 5.1, "verdichter": "ON"})
+    assert client.messages == []
+
+    publish(publisher, client, {"tempaussen": 5.2, "verdichter": "OFF"})
+    assert sorted(client.messages) == [("hp/values/tempaussen", "5.2", True), ("hp/values/verdichter", "OFF", True)]
+
+def test_invalid_values_clear_the_retained_topic():
+    publisher = ChangePublisher("hp", 0, {}, heartbeat=0)
+    client = FakeClient()
+
+    publish(publisher, client, {"tempaussen": 5.0})
+    publish(publisher, client, {"tempaussen": None})
+    assert client.messages[-1] == ("hp/values/tempaussen", "", True)
+
+def test_reset_sends_everything_again():
+    publisher = ChangePublisher("hp", 0, {}, heartbeat=0)
+    client = FakeClient()
+
+    publish(publisher, client, {"tempaussen": 5.0})
+    publisher.reset()
+    publish(publisher, client, {"tempaussen": 5.0})
+    assert len(client.messages) == 2
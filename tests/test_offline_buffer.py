@@ -0,0 +1,50 @@
+import json
+import time
+import asyncio
+
+from offline_buffer import OfflineBuffer
+
+class FakeClient:
+
+    def __init__(self, accept: int = 1000) -> None:
+        self.connected = True
+        self.accept = accept
+        self.messages = []
+
+    async def publish(self, topic, payload, qos=0, retain=False):
+        if len(self.messages) >= self.accept:
+            return False
+        self.messages.append((topic, json.loads(payload)))
+        return True
+
+def test_samples_survive_a_restart(tmp_path):
+    path = str(tmp_path / "buffer.sqlite")
+    buffer = OfflineBuffer(path)
+    buffer.push("hp", {"tempaussen": 5.0})
+    buffer.close()
+
+    buffer = OfflineBuffer(path)
+    assert len(buffer) == 1
+    assert buffer.peek()[0][1] == "hp"
+    assert buffer.peek()[0][3] == {"tempaussen": 5.0}
+
+def test_oldest_samples_are_dropped(tmp_path):
+    buffer = OfflineBuffer(str(tmp_path / "buffer.sqlite"), maxEntries=3, maxAge=3600.)
+    for i in range(5):
+        buffer.push("hp", {"i": i})
+    assert [values["i"] for rowId, topic, timestamp, values in buffer.peek()] == [2, 3, 4]
+
+    #a sample older than maxAge goes first
+    buffer.push("hp", {"i": 5}, time.time() - 7200.)
+    assert [values["i"] for rowId, topic, timestamp, values in buffer.peek()] == [2, 3, 4]
+
+def test_replay_stops_at_the_first_refused_sample(tmp_path):
+    buffer = OfflineBuffer(str(tmp_path / "buffer.sqlite"))
+    for i in range(3):
+        buffer.push("hp", {"i": i})
+
+    client = FakeClient(accept=2)
+    assert asyncio.run(buffer.replay(client, 0, rate=0)) == 2
+    assert [topic for topic, payload in client.messages] == ["hp/buffered", "hp/buffered"]
+    assert client.messages[0][1]["values"] == {"i": 0}
+    assert len(buffer) == 1
@@ -0,0 +1,47 @@
+import json
+import pytest
+
+from htheatpump.htparams import HtDataTypes, HtParams
+from ha_sensors import normalizeKey
+from payload_codec import PAYLOAD_FORMATS, PayloadEncoder
+
+BOOL = next(name for name, param in HtParams.items() if param.data_type == HtDataTypes.BOOL)
+INT = next(name for name, param in HtParams.items() if param.data_type == HtDataTypes.INT)
+FLOAT = next(name for name, param in HtParams.items() if param.data_type == HtDataTypes.FLOAT)
+
+STATS = {normalizeKey(BOOL): "ON", normalizeKey(INT): 3.0, normalizeKey(FLOAT): 21.5, normalizeKey(FLOAT + " x"): None}
+TYPED = {normalizeKey(BOOL): True, normalizeKey(INT): 3, normalizeKey(FLOAT): 21.5, normalizeKey(FLOAT + " x"): None}
+
+#decode a payload with nothing but its schema, as a consumer would
+def decode(encoder, payload):
+    schema = json.loads(encoder.schema())
+    if schema["format"] == "json":
+        return json.loads(payload)
+    if schema["format"] == "compact":
+        values = json.loads(payload)
+    elif schema["format"] == "cbor":
+        values = pytest.importorskip("cbor2").loads(payload)
+    else:
+        values = pytest.importorskip("msgpack").unpackb(payload, strict_map_key=False)
+    return {schema["keys"].get(str(short), short): val for short, val in values.items()}
+
+def test_json_is_the_plain_payload():
+    encoder = PayloadEncoder("json")
+    assert not encoder.binary
+    assert decode(encoder, encoder.encode(STATS)) == STATS
+
+@pytest.mark.parametrize("payloadFormat", [payloadFormat for payloadFormat in PAYLOAD_FORMATS if payloadFormat != "json"])
+def test_typed_formats_round_trip(payloadFormat):
+    encoder = PayloadEncoder(payloadFormat)
+    assert encoder.binary == (payloadFormat in ("cbor", "msgpack"))
+    assert decode(encoder, encoder.encode(STATS)) == TYPED
+    #the encoder and its buffers are reused for the next cycle
+    assert decode(encoder, encoder.encode({normalizeKey(FLOAT): 1.25})) == {normalizeKey(FLOAT): 1.25}
+
+def test_compact_is_smaller_than_json():
+    stats = {normalizeKey(name): 1.0 for name in HtParams.keys()}
+    assert len(PayloadEncoder("compact").encode(stats)) < len(PayloadEncoder("json").encode(stats))
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        PayloadEncoder("xml")
@@ -0,0 +1,87 @@
+import json
+import time
+
+from htheatpump.htparams import HtParams
+from poll_scheduler import PollScheduler, loadPollIntervals
+
+def test_default_load_below_reading_everything_every_minute():
+    intervals = loadPollIntervals()
+    assert sum(60. / interval for interval in intervals.values()) <= len(HtParams.keys())
+
+def test_config_overrides_groups_and_parameters(tmp_path):
+    config = tmp_path / "poll.json"
+    config.write_text(json.dumps({"groups": {"fast": 10}, "parameters": {"Temp. Aussen": 300, "Liegenschaft": 0}}))
+    intervals = loadPollIntervals(str(config))
+    assert intervals["Temp. Vorlauf"] == 10
+    assert intervals["Temp. Aussen"] == 300
+    assert "Liegenschaft" not in intervals
+
+def test_due_and_done_keep_the_grid():
+    scheduler = PollScheduler({"Temp. Aussen": 10, "Temp. Vorlauf": 60})
+    start = min(scheduler._nextDue.values())
+    assert scheduler.due(start) == ["Temp. Aussen", "Temp. Vorlauf"]
+
+    scheduler.done(["Temp. Aussen", "Temp. Vorlauf"], start + 3)
+    assert scheduler.due(start + 9) == []
+    assert scheduler.due(start + 10) == ["Temp. Aussen"]
+
+    #a late tick skips the missed slots instead of catching up
+    scheduler.done(["Temp. Aussen"], start + 35)
+    assert scheduler.nextDue() == start + 40
+
+def test_failed_parameters_come_again_after_the_retry_delay():
+    scheduler = PollScheduler({"Temp. Aussen": 3600}, retryDelay=30)
+    start = scheduler.nextDue()
+    scheduler.done(["Temp. Aussen"], start + 1)
+    scheduler.failed(["Temp. Aussen"], start + 1)
+    assert scheduler.nextDue() == start + 31
+    assert scheduler.due(start + 31) == ["Temp. Aussen"]
+
+def test_requests_join_the_next_regular_batch():
+    scheduler = PollScheduler(loadPollIntervals(), requestSpacing=10)
+    start = scheduler.nextDue()
+    scheduler.done(scheduler.due(start), start)
+
+    #right after a batch, the fast group comes before the timeout of the reader
+    scheduler.request(["Temp. Aussen"], timeout=30, now=start)
+    fast = scheduler.nextDue()
+    assert fast == start + scheduler.intervals["Temp. Vorlauf"]
+    assert scheduler.due(fast - 1) == []
+    names = scheduler.due(fast)
+    assert "Temp. Aussen" in names and "Temp. Vorlauf" in names
+    scheduler.done(names, fast)
+    assert scheduler._requested == {}
+
+def test_requests_get_a_batch_of_their_own_only_if_no_regular_one_comes_in_time():
+    scheduler = PollScheduler({"Temp. Aussen": 3600}, requestSpacing=10)
+    start = scheduler.nextDue()
+    scheduler.done(scheduler.due(start), start)
+
+    scheduler.request(["Temp. Vorlauf"], timeout=30, now=start)
+    assert scheduler.nextDue() == start + 10
+    assert scheduler.due(start + 9) == []
+    assert scheduler.due(start + 10) == ["Temp. Vorlauf"]
+    scheduler.done(["Temp. Vorlauf"], start + 10)
+
+    #the next request waits for the spacing again
+    scheduler.request(["Temp. Vorlauf"], timeout=30, now=start + 10)
+    assert scheduler.nextDue() == start + 20
+
+def test_requests_without_polled_parameters():
+    scheduler = PollScheduler({}, requestSpacing=10)
+    scheduler.request(["Temp. Vorlauf"])
+    assert scheduler.due() == ["Temp. Vorlauf"]
+
+def test_a_request_during_the_batch_stays_open():
+    scheduler = PollScheduler({}, requestSpacing=10)
+    start = time.monotonic()
+    scheduler.request(["Temp. Vorlauf"], now=start)
+    names = scheduler.due(start)
+    assert names == ["Temp. Vorlauf"]
+
+    #the same key again while its batch is read
+    scheduler.request(["Temp. Vorlauf"], now=start + 0.5)
+    scheduler.done(names, start + 1)
+    assert scheduler.due(start + 10) == ["Temp. Vorlauf"]
+    scheduler.done(["Temp. Vorlauf"], start + 11)
+    assert scheduler.due(start + 100) == []
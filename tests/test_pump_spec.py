@@ -0,0 +1,17 @@
+import pytest
+
+from htmqtt import parsePumpSpec
+
+def test_device_topic_and_optional_baudrate():
+    assert parsePumpSpec("/dev/ttyUSB0:hp1", 115200) == ("/dev/ttyUSB0", 115200, "hp1")
+    assert parsePumpSpec("/dev/ttyUSB0:hp1:19200", 115200) == ("/dev/ttyUSB0", 19200, "hp1")
+
+def test_device_names_with_colons():
+    device = "/dev/serial/by-path/pci-0000:00:14.0-usb-0:2:1.0-port0"
+    assert parsePumpSpec(device + ":hp1", 115200) == (device, 115200, "hp1")
+    assert parsePumpSpec(device + ":hp1:9600", 115200) == (device, 9600, "hp1")
+
+@pytest.mark.parametrize("spec", ["/dev/ttyUSB0", ":hp1", "/dev/ttyUSB0:", "/dev/ttyUSB0:hp1:1234"])
+def test_invalid_specs(spec):
+    with pytest.raises(ValueError):
+        parsePumpSpec(spec, 115200)
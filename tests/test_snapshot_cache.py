@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+from snapshot_cache import SnapshotCache
+
+def test_fresh_values_are_served_from_the_cache():
+    requests = []
+    cache = SnapshotCache(lambda names, timeout: requests.append(names))
+    cache.update({"tempaussen": 5.0}, time.time())
+
+    values = asyncio.run(cache.read(["tempaussen", "tempvorlauf"]))
+    assert values["tempaussen"][0] == 5.0
+    assert values["tempvorlauf"] is None
+
+    asyncio.run(cache.read(["tempaussen"], maxAge=60))
+    assert requests == []
+
+def test_stale_values_are_requested_and_awaited():
+    async def scenario():
+        requests = []
+        cache = SnapshotCache(lambda names, timeout: requests.append(names))
+        cache.update({"tempaussen": 5.0, "tempvorlauf": 30.0}, time.time() - 120)
+
+        reader = asyncio.create_task(cache.read(["tempaussen", "tempvorlauf"], maxAge=60, timeout=5))
+        await asyncio.sleep(0)
+        assert requests == [["Temp. Aussen", "Temp. Vorlauf"]]
+
+        cache.update({"tempaussen": 6.0}, time.time())
+        await asyncio.sleep(0)
+        assert not reader.done()
+        cache.update({"tempvorlauf": 31.0}, time.time())
+        values = await asyncio.wait_for(reader, 1)
+        assert values["tempaussen"][0] == 6.0
+        assert values["tempvorlauf"][0] == 31.0
+
+    asyncio.run(scenario())
+
+def test_a_failed_read_keeps_the_old_value_and_ends_the_wait():
+    async def scenario():
+        cache = SnapshotCache(lambda names, timeout: None)
+        old = time.time() - 120
+        cache.update({"tempaussen": 5.0}, old)
+
+        reader = asyncio.create_task(cache.read(["tempaussen"], maxAge=60, timeout=5))
+        await asyncio.sleep(0)
+        cache.update({"tempaussen": None}, time.time())
+        values = await asyncio.wait_for(reader, 1)
+        assert values["tempaussen"] == (5.0, old)
+        assert cache.failed("tempaussen")
+
+        cache.update({"tempaussen": 6.0}, time.time())
+        assert not cache.failed("tempaussen")
+
+    asyncio.run(scenario())
+
+def test_a_read_gives_up_after_the_timeout():
+    cache = SnapshotCache(lambda names, timeout: None)
+    values = asyncio.run(cache.read(["tempaussen"], maxAge=60, timeout=0.05))
+    assert values == {"tempaussen": None}
+    assert cache._waiters == []
@@ -0,0 +1,37 @@
+from discovery_cache import DiscoveryCache, MessageRecorder, hashMessages
+from identity_cache import IdentityCache
+from state_file import JsonStateFile
+
+def test_missing_and_unreadable_files_start_empty(tmp_path):
+    path = tmp_path / "state.json"
+    assert JsonStateFile(path, "state").load() == {}
+
+    path.write_text("{broken")
+    assert JsonStateFile(path, "state").load() == {}
+
+    path.write_text("[1, 2]")
+    assert JsonStateFile(path, "state").load() == {}
+
+def test_save_replaces_the_file(tmp_path):
+    path = tmp_path / "state.json"
+    stateFile = JsonStateFile(path, "state")
+    stateFile.save({"a": 1})
+    stateFile.save({"a": 2})
+    assert JsonStateFile(path, "state").load() == {"a": 2}
+    assert list(tmp_path.iterdir()) == [path]
+
+def test_discovery_cache_survives_a_restart(tmp_path):
+    recorder = MessageRecorder()
+    recorder.publish("homeassistant/sensor/hp/config", "{}", 1, True)
+    digest = hashMessages(recorder.messages)
+
+    cache = DiscoveryCache(tmp_path / "discovery.json")
+    assert not cache.published("hp", digest)
+    cache.store("hp", digest)
+    assert DiscoveryCache(tmp_path / "discovery.json").published("hp", digest)
+
+def test_identity_cache_survives_a_restart(tmp_path):
+    cache = IdentityCache(tmp_path / "identity.json")
+    assert cache.get("hp") is None
+    cache.store("hp", ("3.0.20", 123456))
+    assert IdentityCache(tmp_path / "identity.json").get("hp") == ("3.0.20", 123456)
@@ -0,0 +1,27 @@
+from htheatpump.htparams import HtParams
+from value_transform import applyTransforms, buildTransforms
+
+TRANSFORMS = buildTransforms()
+
+def transform(name, val):
+    return applyTransforms(TRANSFORMS, {name: val})
+
+def test_readings_beyond_the_parameter_definition_are_kept():
+    #the HtParams ranges are setting limits, hot water and flow temperatures go above them
+    assert HtParams["Temp. Vorlauf"].max_val < 75.
+    assert transform("Temp. Vorlauf", 75.) == {"tempvorlauf": 75.}
+    assert transform("Temp. Kondensation", 65.) == {"tempkondensation": 65.}
+    assert transform("Frischwasserpumpe", 150) == {"frischwasserpumpe": 150.}
+
+def test_disconnected_temperature_sensors_are_none():
+    assert transform("Temp. Aussen", -50.) == {"tempaussen": None}
+    assert transform("Temp. Aussen", -45.) == {"tempaussen": -45.}
+
+def test_counters_have_no_upper_limit():
+    assert transform("BSZ Verdichter Betriebsst. ges", 10 ** 7) == {"bszverdichterbetriebsstges": 10. ** 7}
+
+def test_booleans_and_enums():
+    assert transform("Verdichter", True) == {"verdichter": "ON"}
+    assert transform("Verdichter", False) == {"verdichter": "OFF"}
+    assert transform("Betriebsart", 1) == {"betriebsart": "Auto"}
+    assert transform("Betriebsart", 42) == {"betriebsart": None}
@@ -0,0 +1,61 @@
+from typing import NamedTuple
+
+from htheatpump.htparams import HtDataTypes, HtParams
+from ha_sensors import SENSORS, normalizeKey
+
+#precomputed normalization of one heat pump parameter
+class ParamTransform(NamedTuple):
+    key: str
+    enumMap: dict = None
+    isBool: bool = False
+    minVal: float = None
+    maxVal: float = None
+
+    def convert(self, val):
+        if self.enumMap is not None:
+            return self.enumMap.get(val)
+
+        if self.isBool:
+            return "ON" if val else "OFF"
+
+        try:
+            val = float(val)
+        except (TypeError, ValueError):
+            return val
+
+        #values outside of the valid range are measurement errors (e.g. disconnected sensors)
+        if (self.minVal is not None and val < self.minVal) or (self.maxVal is not None and val > self.maxVal):
+            return None
+        return val
+
+def createTransform(name: str, sensorDef=None) -> ParamTransform:
+    param = HtParams.get(name)
+    if param is None:
+        return ParamTransform(normalizeKey(name))
+
+    if param.data_type == HtDataTypes.BOOL:
+        return ParamTransform(normalizeKey(name), isBool=True)
+
+    #only the plausibility limits of the sensor table filter readings
+    minVal, maxVal = None, None
+    enumMap = None
+    if sensorDef is not None:
+        if sensorDef.limits is not None:
+            minVal, maxVal = sensorDef.limits
+        enumMap = sensorDef.enumMap
+
+    return ParamTransform(normalizeKey(name), enumMap=enumMap, minVal=minVal, maxVal=maxVal)
+
+#build the transform of every known parameter from HtParams and the sensor table
+def buildTransforms() -> dict:
+    sensorDefs = {sensorDef.name: sensorDef for sensorDef in SENSORS}
+    return {name: createTransform(name, sensorDefs.get(name)) for name in HtParams.keys()}
+
+def applyTransforms(transforms: dict, data: dict) -> dict:
+    norm_values = {}
+    for name, val in data.items():
+        transform = transforms.get(name)
+        if transform is None:
+            transform = transforms[name] = createTransform(name)
+        norm_values[transform.key] = transform.convert(val)
+    return norm_values